@@ -88,4 +88,22 @@ STATIC_URL = 'static/'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Source of car images; point at a local stand-in to develop or test without the real CDN
+IMAGE_CDN_URL = 'https://cdn.imagin.studio/getimage'
+
+# Local memory by default; FileBasedCache shares cached pages between processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Touched whenever the catalog changes; its mtime versions cached pages and
+# makes every server process reload its search suggestions
+CATALOG_VERSION_FILE = BASE_DIR / '.catalog_version'
+
+# Part of every cached page, fragment and ETag; change it when a deploy
+# changes what the pages render, so nothing cached by the old code is served
+CATALOG_CACHE_VERSION = '1'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
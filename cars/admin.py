@@ -14,7 +14,7 @@ class CarAdmin(admin.ModelAdmin):
     list_filter = ['brand', 'body_style', 'data_source']
     search_fields = ['name', 'brand', 'description']
     ordering = ['brand', 'name']
-    readonly_fields = ['wiki_page_id', 'created_at']
+    readonly_fields = ['min_year', 'max_year', 'wiki_page_id', 'wiki_revision_id', 'created_at', 'updated_at']
     inlines = [GenerationInline]
 
     fieldsets = (
@@ -22,10 +22,10 @@ class CarAdmin(admin.ModelAdmin):
             'fields': ('name', 'brand', 'description')
         }),
         ('Classification', {
-            'fields': ('body_style', 'car_class', 'production_years')
+            'fields': ('body_style', 'car_class', 'production_years', 'min_year', 'max_year')
         }),
         ('Data Source', {
-            'fields': ('data_source', 'wiki_page_id', 'created_at'),
+            'fields': ('data_source', 'wiki_page_id', 'wiki_revision_id', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -37,3 +37,4 @@ class GenerationAdmin(admin.ModelAdmin):
     list_filter = ['car__brand', 'year_start']
     search_fields = ['car__name', 'car__brand', 'name', 'code', 'engine']
     autocomplete_fields = ['car']
+    readonly_fields = ['horsepower_hp', 'torque_nm', 'top_speed_kmh', 'acceleration_s']
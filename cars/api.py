@@ -0,0 +1,62 @@
+"""
+JSON representation of cars for the read-only API.
+
+Cars are read as values() projections and their generations are fetched
+with one query per batch of cars, so neither API pages nor the NDJSON
+export build model instances.
+"""
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Generation
+
+CAR_FIELDS = [
+    'id', 'name', 'brand', 'description', 'body_style', 'car_class',
+    'production_years', 'min_year', 'max_year', 'wiki_page_id',
+    'data_source', 'created_at', 'updated_at',
+]
+
+GENERATION_FIELDS = [
+    'id', 'name', 'code', 'year_start', 'year_end', 'engine', 'horsepower',
+    'torque', 'top_speed', 'acceleration', 'transmission', 'horsepower_hp',
+    'torque_nm', 'top_speed_kmh', 'acceleration_s',
+]
+
+# Cars read per database round trip by the export
+EXPORT_CHUNK_SIZE = 500
+
+
+def car_values(queryset):
+    return queryset.values(*CAR_FIELDS)
+
+
+def attach_generations(cars):
+    """Add a 'generations' list (newest first) to each car dict, with one query. Returns cars."""
+    by_id = {}
+    for car in cars:
+        car['generations'] = []
+        by_id[car['id']] = car
+    generations = (
+        Generation.objects.filter(car_id__in=by_id)
+        .order_by('car_id', '-year_start', 'id')
+        .values('car_id', *GENERATION_FIELDS)
+    )
+    for generation in generations:
+        by_id[generation.pop('car_id')]['generations'].append(generation)
+    return cars
+
+
+def export_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the cars of queryset as newline-delimited JSON, one string per
+    chunk of cars, streaming from the database cursor.
+    """
+    cars = car_values(queryset).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(cars, chunk_size))
+        if not chunk:
+            return
+        attach_generations(chunk)
+        yield ''.join(json.dumps(car, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for car in chunk)
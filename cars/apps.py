@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CarsConfig(AppConfig):
+    name = 'cars'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,100 @@
+"""
+Catalog versioning and page caching.
+
+The catalog version is the modification time of CATALOG_VERSION_FILE,
+which the importers and model signals bump whenever cars change (see
+cars.signals). Cached pages, template fragments and facets include it in
+their keys, so one bump makes all of them unreachable at once in every
+process. The version lives on disk rather than in the cache, so this works
+with the local-memory and file cache backends alike. The keys and ETags
+also carry the CATALOG_CACHE_VERSION setting, which covers changes to the
+code rather than the data.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Superseded entries are never read again; the timeouts only bound how
+# long they take up space
+PAGE_TIMEOUT = 60 * 60 * 24
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def version_path():
+    return Path(settings.CATALOG_VERSION_FILE)
+
+
+def catalog_version():
+    try:
+        return os.stat(version_path()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_catalog_version():
+    """Invalidate everything cached for the current catalog."""
+    path = version_path()
+    previous = catalog_version()
+    path.touch()
+    # Filesystem timestamps can be coarse; make sure the version always moves
+    if catalog_version() <= previous:
+        os.utime(path, ns=(previous + 1, previous + 1))
+
+
+def cache_version():
+    """The catalog version qualified by the deployed CATALOG_CACHE_VERSION."""
+    return f'{settings.CATALOG_CACHE_VERSION}.{catalog_version()}'
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag for a page that changes only with the catalog (it is per URL already)."""
+    return cache_version() if catalog_version() else None
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    version = catalog_version()
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc) if version else None
+
+
+def normalized_query(request):
+    """
+    The query string with empty parameters dropped, values stripped and
+    parameters sorted, so equivalent URLs share a cache entry.
+    """
+    pairs = sorted(
+        (key, value.strip())
+        for key, values in request.GET.lists()
+        for value in values
+        if value.strip()
+    )
+    return urlencode(pairs)
+
+
+def page_key(request):
+    digest = hashlib.sha1(f'{request.path}?{normalized_query(request)}'.encode()).hexdigest()
+    return f'catalog-page:{cache_version()}:{digest}'
+
+
+def cache_catalog_page(view):
+    """
+    Serve GET and HEAD requests from the cache until the catalog version
+    changes. Only for views whose output depends on nothing but the URL.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        key = page_key(request)
+        response = cache.get(key)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response, PAGE_TIMEOUT)
+        return response
+    return wrapper
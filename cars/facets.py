@@ -0,0 +1,55 @@
+"""
+Brand, body style and decade facets for the catalog sidebar.
+
+All three come from one grouped query over Car, with the number of cars
+in each choice ("BMW (132)"), and are kept in Django's cache until the
+catalog version changes (see cars.caching), so a warm sidebar costs no
+queries.
+"""
+from collections import Counter, namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from .caching import cache_version
+from .models import Car
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+Facets = namedtuple('Facets', ['brands', 'body_styles', 'decades'])
+
+
+def compute():
+    """Facets with counts, as sorted lists of (value, number of cars)."""
+    # Cars are grouped by the decades their years start and end in; a car
+    # counts towards every decade it spans, as the year filter matches it
+    rows = (
+        Car.objects.order_by()
+        .values(
+            'brand', 'body_style',
+            first_decade=F('min_year') / 10 * 10,
+            last_decade=F('max_year') / 10 * 10,
+        )
+        .annotate(count=Count('*'))
+    )
+    brands = Counter()
+    body_styles = Counter()
+    decades = Counter()
+    for row in rows:
+        count = row['count']
+        brands[row['brand']] += count
+        if row['body_style']:
+            body_styles[row['body_style']] += count
+        if row['first_decade'] is not None:
+            for decade in range(row['first_decade'], row['last_decade'] + 1, 10):
+                decades[decade] += count
+    return Facets(sorted(brands.items()), sorted(body_styles.items()), sorted(decades.items()))
+
+
+def get_facets():
+    key = f'catalog-facets:{cache_version()}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute()
+        cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Car
+from .facets import get_facets
 
 
 class CarSearchForm(forms.Form):
@@ -17,6 +17,16 @@ class CarFilterForm(forms.Form):
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'})
     )
+    body_style = forms.ChoiceField(
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    decade = forms.TypedChoiceField(
+        required=False,
+        coerce=int,
+        empty_value=None,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
     year_min = forms.IntegerField(
         required=False,
         widget=forms.NumberInput(attrs={
@@ -32,8 +42,76 @@ class CarFilterForm(forms.Form):
         })
     )
 
+    hp_min = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Min hp',
+            'class': 'form-control'
+        })
+    )
+    hp_max = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Max hp',
+            'class': 'form-control'
+        })
+    )
+    top_speed_min = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Min km/h',
+            'class': 'form-control'
+        })
+    )
+    top_speed_max = forms.IntegerField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Max km/h',
+            'class': 'form-control'
+        })
+    )
+    acceleration_min = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Min s',
+            'step': '0.1',
+            'class': 'form-control'
+        })
+    )
+    acceleration_max = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'placeholder': 'Max s',
+            'step': '0.1',
+            'class': 'form-control'
+        })
+    )
+    sort = forms.ChoiceField(
+        required=False,
+        choices=[
+            ('', 'Name'),
+            ('power', 'Most powerful'),
+            ('speed', 'Fastest top speed'),
+            ('acceleration', 'Quickest 0-100'),
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        brands = Car.objects.values_list('brand', flat=True).distinct().order_by('brand')
-        brand_choices = [('', 'All Brands')] + [(b, b) for b in brands]
-        self.fields['brand'].choices = brand_choices
+        facets = get_facets()
+        self.fields['brand'].choices = [('', 'All Brands')] + [
+            (brand, f"{brand} ({count:,})") for brand, count in facets.brands
+        ]
+        self.fields['body_style'].choices = [('', 'All Body Styles')] + [
+            (body_style, f"{body_style} ({count:,})") for body_style, count in facets.body_styles
+        ]
+        self.fields['decade'].choices = [('', 'Any Decade')] + [
+            (decade, f"{decade}s ({count:,})") for decade, count in facets.decades
+        ]
@@ -0,0 +1,105 @@
+"""
+Typo-tolerant search through a trigram index of the catalog vocabulary.
+
+Every word of Car.brand, Car.name and Generation.code is stored with its
+trigrams ("lamborghini" -> "  l", " la", "lam", ..., "ni "). A misspelled
+query word is matched to the vocabulary word sharing the most trigrams
+relative to their combined size (Jaccard similarity, as in pg_trgm), so
+"Lamborgini" becomes "lamborghini". car_list re-runs its normal search
+with the corrected query when the exact one finds nothing.
+
+The vocabulary is a few words per car, far smaller than the catalog, so a
+lookup reads a handful of index ranges and is fast enough per keystroke.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Car, Generation, SearchTrigram
+
+WORD_RE = re.compile(r'\w+')
+
+# Minimum similarity for a correction (pg_trgm's default threshold)
+SIMILARITY_THRESHOLD = 0.3
+
+# Shorter words have too few trigrams to correct reliably
+MIN_WORD_LENGTH = 3
+
+
+def normalize(text):
+    """Lowercase text and strip accents: 'Citroën' -> 'citroen'."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def vocabulary():
+    """Distinct words of every brand, model name and generation code."""
+    found = set()
+    for brand, name in Car.objects.values_list('brand', 'name').iterator(chunk_size=5000):
+        found.update(words(brand))
+        found.update(words(name))
+    for code in Generation.objects.exclude(code='').values_list('code', flat=True).iterator(chunk_size=5000):
+        found.update(words(code))
+    max_length = SearchTrigram._meta.get_field('word').max_length
+    return {word for word in found if len(word) <= max_length}
+
+
+def rebuild(batch_size=5000):
+    """Replace the trigram index with the current vocabulary. Returns the number of words."""
+    rows = []
+    vocab = vocabulary()
+    for word in vocab:
+        grams = trigrams(word)
+        rows.extend(SearchTrigram(trigram=gram, word=word, word_trigrams=len(grams)) for gram in grams)
+    with transaction.atomic():
+        SearchTrigram.objects.all().delete()
+        SearchTrigram.objects.bulk_create(rows, batch_size=batch_size)
+    return len(vocab)
+
+
+def similar_words(word, limit=5, threshold=SIMILARITY_THRESHOLD):
+    """[(vocabulary word, similarity)] for word, most similar first."""
+    grams = trigrams(word)
+    candidates = (
+        SearchTrigram.objects.filter(trigram__in=grams)
+        .values_list('word', 'word_trigrams')
+        .annotate(shared=Count('*'))
+    )
+    scored = [
+        (candidate, shared / (len(grams) + word_trigrams - shared))
+        for candidate, word_trigrams, shared in candidates
+    ]
+    scored = [(candidate, score) for candidate, score in scored if score >= threshold]
+    # Ties go to the word closest in length, then alphabetically
+    scored.sort(key=lambda item: (-item[1], abs(len(item[0]) - len(word)), item[0]))
+    return scored[:limit]
+
+
+def correct(query):
+    """
+    Replace each query word by its most similar vocabulary word. Returns
+    None when nothing could be corrected.
+    """
+    corrected = []
+    changed = False
+    for word in words(query):
+        best = similar_words(word, limit=1) if len(word) >= MIN_WORD_LENGTH else []
+        if best and best[0][0] != word:
+            corrected.append(best[0][0])
+            changed = True
+        else:
+            corrected.append(word)
+    return ' '.join(corrected) if changed else None
@@ -0,0 +1,136 @@
+"""
+Local copies of the IMAGIN.Studio car images.
+
+Each angle is downloaded once at IMAGE_WIDTH and resized with Pillow into
+WebP and JPEG variants under MEDIA_ROOT/car_images/<key>/, where key is a
+hash of the image base URL. Local URLs include the key, so a car whose
+brand, name or model year changes gets new URLs and the old responses can
+be cached by browsers indefinitely.
+"""
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image
+
+from .models import GALLERY_ANGLES, IMAGE_WIDTH, Generation
+
+# Variant widths for srcset; the largest is the downloaded size
+IMAGE_WIDTHS = [320, 640, IMAGE_WIDTH]
+
+# URL extension -> (Pillow format, content type, save options)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+IMAGE_DIR = 'car_images'
+
+ImageSet = namedtuple('ImageSet', ['src', 'srcset', 'webp_srcset'])
+
+
+class ImageFetchError(Exception):
+    """The CDN did not return a usable image."""
+
+
+def image_key(base_url):
+    return hashlib.sha1(base_url.encode()).hexdigest()[:16]
+
+
+def variant_path(key, angle, width, fmt):
+    return Path(settings.MEDIA_ROOT) / IMAGE_DIR / key / f'{angle}-{width}.{fmt}'
+
+
+def has_variants(key, angle):
+    return all(
+        variant_path(key, angle, width, fmt).exists()
+        for width in IMAGE_WIDTHS for fmt in IMAGE_FORMATS
+    )
+
+
+def fetch_variants(base_url, angle, session=None, timeout=30):
+    """Download one angle from the CDN and store every width and format of it."""
+    url = f"{base_url}&angle={angle}&width={IMAGE_WIDTH}"
+    try:
+        response = (session or requests).get(url, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise ImageFetchError(f"{url}: {e}") from e
+    if not response.headers.get('Content-Type', '').startswith('image/'):
+        raise ImageFetchError(f"{url}: not an image ({response.headers.get('Content-Type')})")
+    write_variants(response.content, image_key(base_url), angle)
+
+
+def write_variants(data, key, angle):
+    try:
+        source = Image.open(BytesIO(data))
+        source.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageFetchError(f"Cannot decode image for {key}/{angle}: {e}") from e
+
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA')
+    # JPEG has no alpha; flatten the transparent studio background onto white once
+    if source.mode == 'RGBA':
+        flat = Image.new('RGB', source.size, 'white')
+        flat.paste(source, mask=source.getchannel('A'))
+    else:
+        flat = source
+
+    for width in IMAGE_WIDTHS:
+        for fmt, (pil_format, _, options) in IMAGE_FORMATS.items():
+            image = flat if pil_format == 'JPEG' else source
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            save_atomic(image, variant_path(key, angle, width, fmt), pil_format, options)
+
+
+def save_atomic(image, path, pil_format, options):
+    """Write via a temporary file so a request never serves a half-written image."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, pil_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def image_url(obj, angle, width, fmt):
+    """Local URL of one variant of a Car or Generation image, or None."""
+    if not obj.image_base_url:
+        return None
+    kind = 'generation' if isinstance(obj, Generation) else 'car'
+    return reverse('cars:car_image', kwargs={
+        'kind': kind, 'pk': obj.pk, 'key': image_key(obj.image_base_url),
+        'angle': angle, 'width': width, 'fmt': fmt,
+    })
+
+
+def image_set(obj, angle=GALLERY_ANGLES[0]):
+    """src and srcsets of one angle for an <img>/<picture>, or None without an image."""
+    if not obj.image_base_url:
+        return None
+    urls = {
+        fmt: [(width, image_url(obj, angle, width, fmt)) for width in IMAGE_WIDTHS]
+        for fmt in IMAGE_FORMATS
+    }
+    return ImageSet(
+        src=urls['jpg'][-1][1],
+        srcset=', '.join(f'{url} {width}w' for width, url in urls['jpg']),
+        webp_srcset=', '.join(f'{url} {width}w' for width, url in urls['webp']),
+    )
+
+
+def gallery(obj):
+    if not obj.image_base_url:
+        return []
+    return [image_set(obj, angle) for angle in GALLERY_ANGLES]
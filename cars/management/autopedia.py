@@ -0,0 +1,233 @@
+"""
+Autopedia wikitext parsing.
+
+Plain functions with no Django imports, so whole batches of pages can be
+parsed in worker processes and the results sent back to the DB writer.
+"""
+import re
+
+from cars.management import wikitext
+
+INFOBOX_FIELDS = ['production', 'model_years', 'class', 'body_style', 'manufacturer']
+
+GENERATION_TITLE_RE = re.compile(
+    r'Generation|gen\.|[0-9]{4}[–-][0-9]{4}|[0-9]{4}-present', re.IGNORECASE
+)
+
+SPEC_PATTERNS = {
+    'engine': re.compile(r'(?:engine|motor)\s*[:=]\s*([^\n]+)', re.IGNORECASE),
+    'horsepower': re.compile(r'(\d+\s*hp[^,\n]*|\d+\s*kW[^,\n]*)', re.IGNORECASE),
+    'torque': re.compile(r'(\d+\s*(?:lb[·⋅]?ft|N[·⋅]?m)[^,\n]*)', re.IGNORECASE),
+    'top_speed': re.compile(r'(?:top\s*speed|max\s*speed)\s*[:=]?\s*(\d+\s*(?:mph|km/h)[^,\n]*)', re.IGNORECASE),
+    'acceleration': re.compile(r'(?:0-60|0-100|acceleration)\s*[:=]?\s*([\d.]+\s*(?:sec|s)[^,\n]*)', re.IGNORECASE),
+    'transmission': re.compile(r'(?:transmission|gearbox)\s*[:=]\s*([^\n]+)', re.IGNORECASE),
+}
+
+def should_skip(title):
+    """Skip non-car pages."""
+    skip_patterns = [
+        'Wiki', 'Category:', 'Template:', 'User:', 'File:',
+        'Help:', 'Main Page', 'Portal:', 'Automotive', 'General Motors',
+        'Fisker Inc', 'Fisker Automotive', 'Eagle', 'Byton', 'Genesis'
+    ]
+    # Skip if it's just a brand name (single word or known brand-only pages)
+    single_word_brands = [
+        'Acura', 'Audi', 'BMW', 'Buick', 'Cadillac', 'Chevrolet',
+        'Ferrari', 'Ford', 'GMC', 'Honda', 'Hyundai', 'Jaguar',
+        'Lexus', 'Mazda', 'Mercedes', 'Nissan', 'Porsche', 'Toyota', 'Volkswagen'
+    ]
+    title_clean = title.replace('_', ' ').strip()
+    if title_clean in single_word_brands:
+        return True
+    return any(pattern in title for pattern in skip_patterns)
+
+
+def parse_car_data(title, content):
+    """Parse car specs from Autopedia wiki content."""
+    # Extract brand and name from title
+    brand, name = extract_brand_name(title)
+    if not brand or not name:
+        return None
+
+    document = wikitext.parse(content)
+
+    # Extract description (first paragraph after infobox)
+    description = extract_description(document)
+
+    # Extract infobox data
+    infobox = extract_infobox(document)
+
+    car_data = {
+        'car': {
+            'name': name,
+            'brand': brand,
+            'description': description,
+            'body_style': infobox.get('body_style', ''),
+            'car_class': infobox.get('class', ''),
+            'production_years': infobox.get('production', ''),
+        },
+        'generations': []
+    }
+
+    # Parse generations from content
+    generations = parse_generations(document, infobox)
+    car_data['generations'] = generations
+
+    return car_data
+
+
+def extract_brand_name(title):
+    """Extract brand and model name from page title."""
+    # Common brand prefixes
+    brands = [
+        'Acura', 'Alfa Romeo', 'Aston Martin', 'Audi', 'BMW', 'Bentley',
+        'Buick', 'Cadillac', 'Chevrolet', 'Chrysler', 'Dodge', 'Ferrari',
+        'Fiat', 'Ford', 'GMC', 'Honda', 'Hyundai', 'Infiniti', 'Jaguar',
+        'Jeep', 'Kia', 'Lamborghini', 'Land Rover', 'Lexus', 'Lincoln',
+        'Lotus', 'Maserati', 'Mazda', 'McLaren', 'Mercedes-Benz', 'Mini',
+        'Mitsubishi', 'Nissan', 'Pagani', 'Porsche', 'Ram', 'Rolls-Royce',
+        'Subaru', 'Tesla', 'Toyota', 'Volkswagen', 'Volvo'
+    ]
+
+    title_clean = title.replace('_', ' ')
+
+    for brand in brands:
+        if title_clean.startswith(brand + ' '):
+            name = title_clean[len(brand):].strip()
+            return brand, name
+        elif title_clean.startswith(brand):
+            name = title_clean[len(brand):].strip()
+            if name:
+                return brand, name
+
+    # If no known brand, try splitting on first space
+    parts = title_clean.split(' ', 1)
+    if len(parts) == 2:
+        return parts[0], parts[1]
+
+    return None, None
+
+
+def clean_markup(value):
+    """Strip links, bold/italic quotes and HTML tags from a field value."""
+    value = re.sub(r'\[\[([^\]|]+\|)?([^\]]+)\]\]', r'\2', value)
+    value = re.sub(r"'''?", '', value)
+    value = re.sub(r'<[^>]+>', '', value)
+    return value.strip()
+
+
+def extract_description(document):
+    """Extract the first paragraph as description."""
+    # Remove infobox and any other templates
+    content_clean = document.strip_templates()
+    # Remove wiki markup
+    content_clean = re.sub(r'\[\[([^\]|]+\|)?([^\]]+)\]\]', r'\2', content_clean)
+    content_clean = re.sub(r"'''?", '', content_clean)
+    # Get first meaningful paragraph
+    paragraphs = content_clean.strip().split('\n\n')
+    for p in paragraphs:
+        p = p.strip()
+        if len(p) > 50 and not p.startswith('=='):
+            return p[:500]
+    return ''
+
+
+def extract_infobox(document):
+    """Extract data from Models infobox template."""
+    infobox = {}
+
+    template = document.find_template('Models', 'Infobox')
+    if template is None:
+        return infobox
+
+    for field in INFOBOX_FIELDS:
+        value = template.get(field)
+        if value:
+            # First line only; later lines are usually <br>-separated alternatives
+            infobox[field] = clean_markup(value.split('\n', 1)[0])
+
+    return infobox
+
+
+def parse_generations(document, infobox):
+    """Parse generation-specific data from content."""
+    generations = []
+
+    # Look for generation headers like "== First Generation ==" or "=== 2001-2006 ===";
+    # other sections up to the next generation header belong to that generation
+    gen_sections = []
+    for section in document.sections:
+        if GENERATION_TITLE_RE.search(section.title):
+            gen_sections.append((section.title.strip(), [section.text]))
+        elif gen_sections:
+            gen_sections[-1][1].append(section.text)
+
+    if gen_sections:
+        # Process each generation section
+        for gen_title, texts in gen_sections:
+            gen_data = parse_generation_specs(gen_title, ''.join(texts))
+            if gen_data:
+                generations.append(gen_data)
+    else:
+        # No explicit generations, create one from infobox
+        gen_data = parse_generation_specs('', document.text)
+        if gen_data:
+            # Try to get years from infobox
+            years = infobox.get('production', '') or infobox.get('model_years', '')
+            year_match = re.search(r'(\d{4})', years)
+            if year_match:
+                gen_data['year_start'] = int(year_match.group(1))
+            generations.append(gen_data)
+
+    return generations
+
+
+def parse_generation_specs(gen_title, content):
+    """Parse specs for a specific generation."""
+    gen_data = {
+        'name': '',
+        'code': '',
+        'year_start': None,
+        'year_end': None,
+        'engine': '',
+        'horsepower': '',
+        'torque': '',
+        'top_speed': '',
+        'acceleration': '',
+        'transmission': '',
+    }
+
+    # Parse generation title for name and years
+    if gen_title:
+        gen_data['name'] = gen_title
+
+        # Extract years from title
+        year_match = re.search(r'(\d{4})[–-](\d{4}|present)', gen_title, re.IGNORECASE)
+        if year_match:
+            gen_data['year_start'] = int(year_match.group(1))
+            if year_match.group(2).lower() != 'present':
+                gen_data['year_end'] = int(year_match.group(2))
+
+    # Extract specs from content
+    for field, pattern in SPEC_PATTERNS.items():
+        match = pattern.search(content)
+        if match:
+            gen_data[field] = clean_markup(match.group(1))[:100]  # Limit length
+
+    return gen_data
+
+
+def parse_pages(batch):
+    """
+    Parse a batch of (page, Revision) pairs fetched from the wiki.
+
+    Returns (page, revision, car_data) for each pair; car_data is None when
+    the page had no content or is not a car article.
+    """
+    results = []
+    for page, revision in batch:
+        car_data = None
+        if revision and revision.content:
+            car_data = parse_car_data(page['title'], revision.content)
+        results.append((page, revision, car_data))
+    return results
@@ -0,0 +1,113 @@
+"""
+Resumable progress tracking for the import commands.
+"""
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+# Page statuses that mean a resumed run does not need to look at the page again
+FINISHED = {'done', 'skipped', 'unchanged'}
+
+
+class Checkpoint:
+    """
+    Persisted import progress: the enumeration continuation token to
+    restart from, the last committed page ID, and a status per page.
+
+    Every enumerated page is begun in order, tagged with the continuation
+    token of the API batch it came from, and finished once its outcome is
+    known. The token saved is that of the earliest page still open, so a
+    resumed run re-enumerates from there and skips finished pages.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.statuses = {}
+        self.last_committed = None
+        self.start_token = None
+        self.last_token = None
+        self.open = OrderedDict()
+
+    @classmethod
+    def default_path(cls, name):
+        return Path(settings.BASE_DIR) / '.checkpoints' / f'{name}.json'
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved checkpoint, or return an empty one if none exists."""
+        checkpoint = cls(path)
+        if checkpoint.path.exists():
+            with open(checkpoint.path, encoding='utf-8') as f:
+                data = json.load(f)
+            checkpoint.statuses = {int(page_id): status for page_id, status in data.get('pages', {}).items()}
+            checkpoint.last_committed = data.get('last_committed_pageid')
+            checkpoint.start_token = checkpoint.last_token = data.get('continue')
+        return checkpoint
+
+    def is_finished(self, page_id):
+        return self.statuses.get(page_id) in FINISHED
+
+    def begin(self, page):
+        """Record that a page has been enumerated but not yet finished."""
+        self.open[page['pageid']] = page.get('continue')
+
+    def finish(self, page_id, status):
+        """
+        Record a page's outcome ('done', 'skipped', 'unchanged' or 'failed').
+
+        Failed pages stay open so a resumed run enumerates and retries them.
+        """
+        self.statuses[page_id] = status
+        if status in FINISHED and page_id in self.open:
+            self.last_token = self.open.pop(page_id)
+        if status == 'done':
+            self.last_committed = page_id
+
+    def resume_token(self):
+        if self.open:
+            return next(iter(self.open.values()))
+        return self.last_token
+
+    def save(self):
+        """Atomically write the checkpoint to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'continue': self.resume_token(),
+            'last_committed_pageid': self.last_committed,
+            'pages': {str(page_id): status for page_id, status in self.statuses.items()},
+        }
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def delete(self):
+        """Remove the checkpoint once an import has completed."""
+        if self.path.exists():
+            self.path.unlink()
+
+
+def add_checkpoint_arguments(parser):
+    """Register the --resume/--checkpoint options."""
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue from the checkpoint left by an interrupted import',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        default='',
+        help='Checkpoint file (default: .checkpoints/<source>.json in the project directory)',
+    )
+
+
+def checkpoint_from_options(options, name):
+    """Load the checkpoint for --resume, or start a fresh one."""
+    path = options['checkpoint'] or Checkpoint.default_path(name)
+    if options['resume']:
+        return Checkpoint.load(path)
+    return Checkpoint(path)
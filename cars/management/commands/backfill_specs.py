@@ -0,0 +1,59 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cars.caching import bump_catalog_version
+from cars.models import Generation
+from cars.specs import SPEC_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Fill the normalised numeric spec fields of existing generations from their text specs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of generations read and updated per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        numeric_fields = [numeric_field for numeric_field, _ in SPEC_FIELDS.values()]
+        only = ['pk', *SPEC_FIELDS, *numeric_fields]
+
+        scanned = 0
+        updated = 0
+        last_pk = 0
+        started = time.monotonic()
+
+        # Page by primary key so each batch is an index range scan, however far in
+        while True:
+            batch = list(
+                Generation.objects.filter(pk__gt=last_pk).order_by('pk').only(*only)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+
+            changed = []
+            for generation in batch:
+                before = [getattr(generation, field) for field in numeric_fields]
+                generation.update_numeric_specs()
+                if [getattr(generation, field) for field in numeric_fields] != before:
+                    changed.append(generation)
+
+            if changed:
+                with transaction.atomic():
+                    Generation.objects.bulk_update(changed, numeric_fields, batch_size=batch_size)
+                updated += len(changed)
+            self.stdout.write(f"Scanned {scanned} generations... (Updated: {updated})")
+
+        # bulk_update sends no signals; cached pages and facets still show the old specs
+        if updated:
+            bump_catalog_version()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone! Scanned: {scanned}, Updated: {updated} in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,98 @@
+import re
+import time
+from django.core.management.base import BaseCommand
+from cars.management import wikitext
+
+INFOBOX_FIELDS = [
+    'name', 'manufacturer', 'production', 'model_years', 'engine', 'transmission',
+    'body_style', 'class', 'wheelbase', 'length', 'width', 'height', 'curb_weight',
+]
+
+
+def build_article(sections, depth):
+    """
+    Build a synthetic article: an infobox, then sections of prose with
+    citation templates and one chain of templates nested depth levels deep.
+    """
+    nested = 'x'
+    for level in range(depth):
+        nested = f'{{{{t{level}|a=[[Link|text]]|{nested}}}}}'
+    infobox = '{{Infobox automobile\n' + ''.join(
+        f'| {field} = [[{field.title()}]] {{{{convert|2|L|abbr=on}}}}\n' for field in INFOBOX_FIELDS
+    ) + '}}\n'
+    prose = 'The car was praised for its [[handling]] and [[Fuel economy in automobiles|economy]]. ' * 8
+    cite = '<ref>{{cite web|url=https://example.com|title=Review|date={{date|2020}}}}</ref>'
+    body = ''.join(
+        f'== Section {i} ==\n{prose}{cite}\n\n{prose}{nested}{cite}\n'
+        f'engine: 2.0 L I4\n300 hp\n'
+        for i in range(sections)
+    )
+    return infobox + "The '''Example''' is a car.\n\n" + body
+
+
+def regex_parse(content):
+    """The previous approach: strip innermost templates until none remain, one search per field."""
+    infobox = re.search(r'\{\{[Ii]nfobox\s+automobile[^}]*?\n(.*?)\n\}\}', content, re.DOTALL | re.IGNORECASE)
+    fields = {}
+    if infobox:
+        for field in INFOBOX_FIELDS:
+            match = re.search(rf'\|\s*{field}\s*=\s*(.+?)(?=\n\||\n\}}\}}|$)', infobox.group(1), re.IGNORECASE | re.DOTALL)
+            if match:
+                fields[field] = match.group(1)
+    text = content
+    while '{{' in text and '}}' in text:
+        stripped = re.sub(r'\{\{[^{}]*\}\}', '', text)
+        if stripped == text:
+            break
+        text = stripped
+    sections = re.split(r'^==+\s*(.+?)\s*==+\s*$', text, flags=re.MULTILINE)
+    return fields, text, sections
+
+
+def tokenizer_parse(content):
+    document = wikitext.parse(content)
+    infobox = document.find_template('Infobox automobile')
+    return infobox.params, document.strip_templates(), document.sections
+
+
+class Command(BaseCommand):
+    help = 'Compare the wikitext tokenizer against repeated regex scans on a large synthetic article'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sections',
+            type=int,
+            default=500,
+            help='Number of sections in the synthetic article'
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=8,
+            help='Template nesting depth'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs (best is reported)'
+        )
+
+    def handle(self, *args, **options):
+        content = build_article(options['sections'], options['depth'])
+        self.stdout.write(f"Article: {len(content):,} characters, nesting depth {options['depth']}")
+
+        results = {}
+        for label, func in [('regex', regex_parse), ('tokenizer', tokenizer_parse)]:
+            best = None
+            for _ in range(max(1, options['repeat'])):
+                started = time.perf_counter()
+                func(content)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = best
+            self.stdout.write(f"  {label:<10} {best * 1000:8.1f} ms")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Speedup: {results['regex'] / results['tokenizer']:.1f}x"
+        ))
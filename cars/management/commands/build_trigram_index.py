@@ -0,0 +1,13 @@
+import time
+from django.core.management.base import BaseCommand
+from cars import fuzzy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram index used for typo-tolerant search (also run after each import)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        words = fuzzy.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Done! Indexed {words} words in {elapsed:.1f}s"))
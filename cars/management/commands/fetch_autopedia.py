@@ -1,8 +1,18 @@
-import re
-import time
+from datetime import datetime, time, timezone
+from itertools import islice
 import requests
-from django.core.management.base import BaseCommand
-from cars.models import Car, Generation
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+from cars import search, signals
+from cars.management.autopedia import parse_pages, should_skip
+from cars.management.checkpoint import add_checkpoint_arguments, checkpoint_from_options
+from cars.management.mediawiki import (
+    MAX_BATCH_SIZE, MediaWikiClient, RateLimiter, chunked, iter_page_contents, iter_parsed,
+)
+from cars.management.wikicache import add_cache_arguments, cache_from_options
+from cars.management.writer import CarWriter
+from cars.models import Car
+from cars.signals import import_finished
 
 
 class Command(BaseCommand):
@@ -25,335 +35,289 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing autopedia data before import'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of concurrent page fetches (default: 1)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=5.0,
+            help='Maximum page requests per second across all workers (0 = unlimited)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MAX_BATCH_SIZE,
+            help=f'Pages fetched per API request (max {MAX_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--parse-workers',
+            type=int,
+            default=1,
+            help='Number of processes parsing wikitext (default: 1, parse in this process)'
+        )
+        parser.add_argument(
+            '--write-batch',
+            type=int,
+            default=200,
+            help='Number of cars written per database transaction'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only re-import pages whose revision differs from the last import'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            default='',
+            help='Only re-import pages changed since this date/time, via recent changes '
+                 '(e.g. 2024-05-01 or 2024-05-01T06:00:00Z; implies --incremental)'
+        )
+        add_cache_arguments(parser)
+        add_checkpoint_arguments(parser)
 
     def handle(self, *args, **options):
         limit = options['limit']
+        since = self.parse_since(options['since']) if options['since'] else None
+        if since and options['offline']:
+            raise CommandError('--since needs the recent changes API and cannot be used with --offline')
+        if options['resume'] and options['clear']:
+            raise CommandError('--resume and --clear cannot be combined')
+        checkpoint = checkpoint_from_options(options, 'autopedia')
+        # Set by the page listings when a request fails before the last page
+        self.listing_failed = False
+        self.cache = cache_from_options(options, 'autopedia')
+        self.client = None if options['offline'] else MediaWikiClient(
+            self.BASE_URL,
+            self.HEADERS,
+            pool_size=options['workers'],
+            limiter=RateLimiter(options['rate'], burst=options['workers']),
+        )
 
         if options['clear']:
-            deleted = Car.objects.filter(data_source='autopedia').delete()
+            with signals.paused():
+                deleted = Car.objects.filter(data_source='autopedia').delete()
+            search.remove_missing()
             self.stdout.write(f"Cleared {deleted[0]} existing autopedia cars")
 
-        self.stdout.write("Fetching page list from Autopedia...")
-        pages = self.get_all_pages(limit)
-        self.stdout.write(f"Found {len(pages)} pages to process")
+        # Pages stream through enumeration, filtering, fetching and writing,
+        # so the first cars are written while later batches are still listed.
+        if since:
+            self.stdout.write(f"Streaming pages changed since {since:%Y-%m-%d %H:%M} UTC...")
+            pages = self.get_recent_changes(since, limit)
+        elif self.client:
+            self.stdout.write("Streaming page list from Autopedia...")
+            pages = self.get_all_pages(limit, apcontinue=checkpoint.start_token)
+        else:
+            self.stdout.write("Streaming page list from cache...")
+            pages = islice(self.cache.pages(), limit or None)
 
-        created = 0
-        updated = 0
         skipped = 0
-
-        for i, page in enumerate(pages, 1):
+        unchanged = 0
+        resumed = 0
+
+        def candidates():
+            """Skip finished and non-car pages before spending a request on them."""
+            nonlocal skipped, resumed
+            for page in pages:
+                if checkpoint.is_finished(page['pageid']):
+                    resumed += 1
+                    continue
+                checkpoint.begin(page)
+                if should_skip(page['title']):
+                    skipped += 1
+                    checkpoint.finish(page['pageid'], 'skipped')
+                else:
+                    yield page
+
+        def unchanged_page(page):
+            nonlocal unchanged
+            unchanged += 1
+            checkpoint.finish(page['pageid'], 'unchanged')
+
+        to_fetch = candidates()
+        if options['incremental'] or since:
+            to_fetch = self.exclude_unchanged(to_fetch, unchanged_page)
+
+        def committed(page_ids):
+            for page_id in page_ids:
+                checkpoint.finish(page_id, 'done')
+            checkpoint.save()
+
+        writer = CarWriter('autopedia', batch_size=options['write_batch'], on_flush=committed)
+
+        # Pages are fetched and parsed concurrently but consumed in order on
+        # this thread, so DB writes and the counters stay single-threaded.
+        results = iter_page_contents(
+            to_fetch,
+            client=self.client,
+            cache=self.cache,
+            refresh=options['refresh'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            on_error=lambda title, e: self.stderr.write(f'Error fetching {title}: {e}'),
+        )
+        parsed = iter_parsed(parse_pages, results, workers=options['parse_workers'])
+        for i, (page, revision, car_data) in enumerate(parsed, 1):
             title = page['title']
             page_id = page['pageid']
 
-            # Skip non-car pages
-            if self.should_skip(title):
-                skipped += 1
-                continue
-
-            self.stdout.write(f"[{i}/{len(pages)}] Processing: {title}")
+            self.stdout.write(f"[{i}] Processing: {title}")
 
-            # Check if already exists
-            existing = Car.objects.filter(wiki_page_id=page_id).first()
-            if existing:
-                updated += 1
-                car = existing
-            else:
-                car = None
-
-            # Fetch page content
-            content = self.get_page_content(title)
-            if not content:
+            if not revision or not revision.content:
                 skipped += 1
+                checkpoint.finish(page_id, 'failed')
                 continue
 
-            # Parse car data
-            car_data = self.parse_car_data(title, content)
             if not car_data:
                 skipped += 1
+                checkpoint.finish(page_id, 'skipped')
                 continue
 
-            # Create or update car
-            if car:
-                for key, value in car_data['car'].items():
-                    setattr(car, key, value)
-                car.save()
-            else:
-                car = Car.objects.create(
-                    wiki_page_id=page_id,
-                    data_source='autopedia',
-                    **car_data['car']
-                )
-                created += 1
-
-            # Create generations
-            if car_data.get('generations'):
-                # Clear existing generations for this car
-                car.generations.all().delete()
-                for gen_data in car_data['generations']:
-                    Generation.objects.create(car=car, **gen_data)
-
-            # Rate limiting
-            time.sleep(0.2)
+            # Queue the car and its generations for the next batched write
+            writer.add(
+                page_id,
+                {**car_data['car'], 'wiki_revision_id': revision.revid},
+                car_data['generations'],
+            )
+
+        writer.close()
+        if self.listing_failed:
+            # Keep the checkpoint so --resume continues from where listing stopped
+            checkpoint.save()
+            raise CommandError(
+                f"Listing pages failed after Created: {writer.created}, Updated: {writer.updated}; "
+                f"run again with --resume to continue"
+            )
+        checkpoint.delete()
+        import_finished.send(sender=self.__class__)
+        if resumed:
+            self.stdout.write(f"Resumed: {resumed} pages were already finished by the previous run")
+        self.stdout.write(
+            f"Wrote {writer.rows} rows in {writer.elapsed:.2f}s ({writer.rows_per_second:.0f} rows/sec)"
+        )
 
         self.stdout.write(self.style.SUCCESS(
-            f"\nDone! Created: {created}, Updated: {updated}, Skipped: {skipped}"
+            f"\nDone! Created: {writer.created}, Updated: {writer.updated}, Skipped: {skipped}, Unchanged: {unchanged}"
         ))
 
-    def should_skip(self, title):
-        """Skip non-car pages."""
-        skip_patterns = [
-            'Wiki', 'Category:', 'Template:', 'User:', 'File:',
-            'Help:', 'Main Page', 'Portal:', 'Automotive', 'General Motors',
-            'Fisker Inc', 'Fisker Automotive', 'Eagle', 'Byton', 'Genesis'
-        ]
-        # Skip if it's just a brand name (single word or known brand-only pages)
-        single_word_brands = [
-            'Acura', 'Audi', 'BMW', 'Buick', 'Cadillac', 'Chevrolet',
-            'Ferrari', 'Ford', 'GMC', 'Honda', 'Hyundai', 'Jaguar',
-            'Lexus', 'Mazda', 'Mercedes', 'Nissan', 'Porsche', 'Toyota', 'Volkswagen'
-        ]
-        title_clean = title.replace('_', ' ').strip()
-        if title_clean in single_word_brands:
-            return True
-        return any(pattern in title for pattern in skip_patterns)
-
-    def get_all_pages(self, limit=0):
-        """Fetch all car pages from Autopedia wiki."""
-        pages = []
-        apcontinue = None
+    def parse_since(self, value):
+        """Parse --since as an aware UTC datetime."""
+        when = parse_datetime(value)
+        if when is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            when = datetime.combine(day, time.min)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return when.astimezone(timezone.utc)
+
+    def exclude_unchanged(self, pages, on_unchanged):
+        """
+        Yield only pages changed since the last import, checking revision
+        IDs 50 pages at a time. on_unchanged(page) is called for the rest.
+        """
+        imported = dict(
+            Car.objects.filter(data_source='autopedia', wiki_revision_id__isnull=False)
+            .values_list('wiki_page_id', 'wiki_revision_id')
+        )
+        for batch in chunked(pages, MAX_BATCH_SIZE):
+            unknown = [page['pageid'] for page in batch if not page.get('revid')]
+            latest = {}
+            if unknown and self.client:
+                try:
+                    latest = self.client.fetch_latest_revids(unknown)
+                except requests.RequestException as e:
+                    self.stderr.write(f'Error fetching revision ids: {e}')
+            for page in batch:
+                revid = page.get('revid') or latest.get(page['pageid'])
+                if revid and imported.get(page['pageid']) == revid:
+                    on_unchanged(page)
+                else:
+                    yield {**page, 'revid': revid}
+
+    def get_all_pages(self, limit=0, apcontinue=None):
+        """
+        Yield car pages from Autopedia wiki as each API batch arrives,
+        optionally starting from a continuation token. Each page records
+        the token of its batch.
+        """
+        count = 0
 
         while True:
             params = {
                 'action': 'query',
                 'list': 'allpages',
                 'aplimit': 500,
-                'format': 'json',
             }
             if apcontinue:
                 params['apcontinue'] = apcontinue
 
             try:
-                response = requests.get(self.BASE_URL, params=params, headers=self.HEADERS, timeout=30)
-                response.raise_for_status()
-                data = response.json()
+                data = self.client.get(params)
             except requests.RequestException as e:
                 self.stderr.write(f'Error fetching pages: {e}')
-                break
-
-            batch = data.get('query', {}).get('allpages', [])
-            pages.extend(batch)
+                self.listing_failed = True
+                return
 
-            if limit and len(pages) >= limit:
-                pages = pages[:limit]
-                break
+            for page in data.get('query', {}).get('allpages', []):
+                yield {**page, 'continue': apcontinue}
+                count += 1
+                if limit and count >= limit:
+                    return
 
             if 'continue' in data:
                 apcontinue = data['continue'].get('apcontinue')
             else:
-                break
-
-        return pages
-
-    def get_page_content(self, title):
-        """Fetch wikitext content for a specific page."""
-        params = {
-            'action': 'parse',
-            'page': title,
-            'format': 'json',
-            'prop': 'wikitext',
-        }
-
-        try:
-            response = requests.get(self.BASE_URL, params=params, headers=self.HEADERS, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            return data.get('parse', {}).get('wikitext', {}).get('*', '')
-        except requests.RequestException:
-            return None
-
-    def parse_car_data(self, title, content):
-        """Parse car specs from Autopedia wiki content."""
-        # Extract brand and name from title
-        brand, name = self.extract_brand_name(title)
-        if not brand or not name:
-            return None
-
-        # Extract description (first paragraph after infobox)
-        description = self.extract_description(content)
-
-        # Extract infobox data
-        infobox = self.extract_infobox(content)
-
-        car_data = {
-            'car': {
-                'name': name,
-                'brand': brand,
-                'description': description,
-                'body_style': infobox.get('body_style', ''),
-                'car_class': infobox.get('class', ''),
-                'production_years': infobox.get('production', ''),
-            },
-            'generations': []
-        }
-
-        # Parse generations from content
-        generations = self.parse_generations(content, infobox)
-        car_data['generations'] = generations
-
-        return car_data
-
-    def extract_brand_name(self, title):
-        """Extract brand and model name from page title."""
-        # Common brand prefixes
-        brands = [
-            'Acura', 'Alfa Romeo', 'Aston Martin', 'Audi', 'BMW', 'Bentley',
-            'Buick', 'Cadillac', 'Chevrolet', 'Chrysler', 'Dodge', 'Ferrari',
-            'Fiat', 'Ford', 'GMC', 'Honda', 'Hyundai', 'Infiniti', 'Jaguar',
-            'Jeep', 'Kia', 'Lamborghini', 'Land Rover', 'Lexus', 'Lincoln',
-            'Lotus', 'Maserati', 'Mazda', 'McLaren', 'Mercedes-Benz', 'Mini',
-            'Mitsubishi', 'Nissan', 'Pagani', 'Porsche', 'Ram', 'Rolls-Royce',
-            'Subaru', 'Tesla', 'Toyota', 'Volkswagen', 'Volvo'
-        ]
-
-        title_clean = title.replace('_', ' ')
-
-        for brand in brands:
-            if title_clean.startswith(brand + ' '):
-                name = title_clean[len(brand):].strip()
-                return brand, name
-            elif title_clean.startswith(brand):
-                name = title_clean[len(brand):].strip()
-                if name:
-                    return brand, name
-
-        # If no known brand, try splitting on first space
-        parts = title_clean.split(' ', 1)
-        if len(parts) == 2:
-            return parts[0], parts[1]
-
-        return None, None
-
-    def extract_description(self, content):
-        """Extract the first paragraph as description."""
-        # Remove infobox
-        content_clean = re.sub(r'\{\{[^}]+\}\}', '', content, flags=re.DOTALL)
-        # Remove wiki markup
-        content_clean = re.sub(r'\[\[([^\]|]+\|)?([^\]]+)\]\]', r'\2', content_clean)
-        content_clean = re.sub(r"'''?", '', content_clean)
-        # Get first meaningful paragraph
-        paragraphs = content_clean.strip().split('\n\n')
-        for p in paragraphs:
-            p = p.strip()
-            if len(p) > 50 and not p.startswith('=='):
-                return p[:500]
-        return ''
-
-    def extract_infobox(self, content):
-        """Extract data from Models infobox template."""
-        infobox = {}
-
-        # Find infobox content
-        infobox_match = re.search(r'\{\{(?:Models|Infobox)[^}]*\}\}', content, re.DOTALL | re.IGNORECASE)
-        if not infobox_match:
-            return infobox
-
-        infobox_text = infobox_match.group(0)
-
-        # Extract fields
-        field_patterns = {
-            'production': r'\|\s*production\s*=\s*([^\n|]+)',
-            'model_years': r'\|\s*model[_ ]?years\s*=\s*([^\n|]+)',
-            'class': r'\|\s*class\s*=\s*([^\n|]+)',
-            'body_style': r'\|\s*body[_ ]?style\s*=\s*([^\n|]+)',
-            'manufacturer': r'\|\s*manufacturer\s*=\s*([^\n|]+)',
-        }
-
-        for field, pattern in field_patterns.items():
-            match = re.search(pattern, infobox_text, re.IGNORECASE)
-            if match:
-                value = match.group(1).strip()
-                # Clean wiki markup
-                value = re.sub(r'\[\[([^\]|]+\|)?([^\]]+)\]\]', r'\2', value)
-                value = re.sub(r"'''?", '', value)
-                value = re.sub(r'<[^>]+>', '', value)
-                infobox[field] = value.strip()
-
-        return infobox
-
-    def parse_generations(self, content, infobox):
-        """Parse generation-specific data from content."""
-        generations = []
-
-        # Look for generation headers like "== First Generation ==" or "=== 2001-2006 ==="
-        gen_pattern = r'==+\s*([^=]+(?:Generation|gen\.|[0-9]{4}[–-][0-9]{4}|[0-9]{4}-present)[^=]*)\s*==+'
-        gen_sections = re.split(gen_pattern, content, flags=re.IGNORECASE)
-
-        if len(gen_sections) > 1:
-            # Process each generation section
-            for i in range(1, len(gen_sections), 2):
-                if i + 1 < len(gen_sections):
-                    gen_title = gen_sections[i].strip()
-                    gen_content = gen_sections[i + 1]
-                    gen_data = self.parse_generation_specs(gen_title, gen_content)
-                    if gen_data:
-                        generations.append(gen_data)
-        else:
-            # No explicit generations, create one from infobox
-            gen_data = self.parse_generation_specs('', content)
-            if gen_data:
-                # Try to get years from infobox
-                years = infobox.get('production', '') or infobox.get('model_years', '')
-                year_match = re.search(r'(\d{4})', years)
-                if year_match:
-                    gen_data['year_start'] = int(year_match.group(1))
-                generations.append(gen_data)
-
-        return generations
-
-    def parse_generation_specs(self, gen_title, content):
-        """Parse specs for a specific generation."""
-        gen_data = {
-            'name': '',
-            'code': '',
-            'year_start': None,
-            'year_end': None,
-            'engine': '',
-            'horsepower': '',
-            'torque': '',
-            'top_speed': '',
-            'acceleration': '',
-            'transmission': '',
-        }
-
-        # Parse generation title for name and years
-        if gen_title:
-            gen_data['name'] = gen_title
-
-            # Extract years from title
-            year_match = re.search(r'(\d{4})[–-](\d{4}|present)', gen_title, re.IGNORECASE)
-            if year_match:
-                gen_data['year_start'] = int(year_match.group(1))
-                if year_match.group(2).lower() != 'present':
-                    gen_data['year_end'] = int(year_match.group(2))
-
-        # Extract specs from content
-        spec_patterns = {
-            'engine': r'(?:engine|motor)\s*[:=]\s*([^\n]+)',
-            'horsepower': r'(\d+\s*hp[^,\n]*|\d+\s*kW[^,\n]*)',
-            'torque': r'(\d+\s*(?:lb[·⋅]?ft|N[·⋅]?m)[^,\n]*)',
-            'top_speed': r'(?:top\s*speed|max\s*speed)\s*[:=]?\s*(\d+\s*(?:mph|km/h)[^,\n]*)',
-            'acceleration': r'(?:0-60|0-100|acceleration)\s*[:=]?\s*([\d.]+\s*(?:sec|s)[^,\n]*)',
-            'transmission': r'(?:transmission|gearbox)\s*[:=]\s*([^\n]+)',
-        }
-
-        for field, pattern in spec_patterns.items():
-            match = re.search(pattern, content, re.IGNORECASE)
-            if match:
-                value = match.group(1).strip()
-                # Clean wiki markup
-                value = re.sub(r'\[\[([^\]|]+\|)?([^\]]+)\]\]', r'\2', value)
-                value = re.sub(r"'''?", '', value)
-                value = re.sub(r'<[^>]+>', '', value)
-                gen_data[field] = value[:100]  # Limit length
-
-        return gen_data
+                return
+
+    def get_recent_changes(self, since, limit=0):
+        """
+        Yield article pages created or edited since the given time, with
+        the newest revision of each page.
+        """
+        seen = set()
+        rccontinue = None
+
+        while True:
+            params = {
+                'action': 'query',
+                'list': 'recentchanges',
+                'rcend': since.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'rcnamespace': 0,
+                'rctype': 'edit|new',
+                'rcprop': 'title|ids',
+                'rclimit': 500,
+            }
+            if rccontinue:
+                params['rccontinue'] = rccontinue
+
+            try:
+                data = self.client.get(params)
+            except requests.RequestException as e:
+                self.stderr.write(f'Error fetching recent changes: {e}')
+                self.listing_failed = True
+                return
+
+            # Changes are listed newest first, so keep the first revision seen per page
+            for change in data.get('query', {}).get('recentchanges', []):
+                if not change.get('pageid') or change['pageid'] in seen:
+                    continue
+                seen.add(change['pageid'])
+                yield {
+                    'pageid': change['pageid'],
+                    'title': change['title'],
+                    'revid': change.get('revid'),
+                }
+                if limit and len(seen) >= limit:
+                    return
+
+            if 'continue' in data:
+                rccontinue = data['continue'].get('rccontinue')
+            else:
+                return
@@ -1,7 +1,12 @@
 import re
 import requests
-from django.core.management.base import BaseCommand
-from cars.models import Car
+from django.core.management.base import BaseCommand, CommandError
+from cars.management import wikitext
+from cars.management.checkpoint import add_checkpoint_arguments, checkpoint_from_options
+from cars.management.mediawiki import MAX_BATCH_SIZE, MediaWikiClient, iter_page_contents
+from cars.management.wikicache import add_cache_arguments, cache_from_options
+from cars.management.writer import CarWriter
+from cars.signals import import_finished
 
 
 class Command(BaseCommand):
@@ -74,88 +79,142 @@ class Command(BaseCommand):
             default='',
             help='Fetch from specific category only (e.g., "BMW vehicles")',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MAX_BATCH_SIZE,
+            help=f'Pages fetched per API request (max {MAX_BATCH_SIZE})',
+        )
+        add_cache_arguments(parser)
+        add_checkpoint_arguments(parser)
 
     def handle(self, *args, **options):
         limit = options['limit']
         single_category = options['category']
+        checkpoint = checkpoint_from_options(options, 'wikipedia')
+        # Set by fetch_category_pages when a request fails before the last page
+        self.listing_failed = False
+        self.cache = cache_from_options(options, 'wikipedia')
+        self.client = None if options['offline'] else MediaWikiClient(self.BASE_URL, self.HEADERS)
 
         categories = [single_category] if single_category else self.CATEGORIES
 
-        self.stdout.write('Fetching car pages from Wikipedia...')
+        # A saved token is [category, cmcontinue]: restart inside that category
+        start_category, start_continue = checkpoint.start_token or (None, None)
+        if start_category in categories:
+            categories = categories[categories.index(start_category):]
 
-        all_pages = []
-        for category in categories:
-            self.stdout.write(f'Fetching category: {category}')
-            pages = self.fetch_category_pages(category, limit - len(all_pages) if limit else 0)
-            all_pages.extend(pages)
-
-            if limit and len(all_pages) >= limit:
-                all_pages = all_pages[:limit]
-                break
-
-        # Remove duplicates by page ID
-        seen_ids = set()
-        unique_pages = []
-        for page in all_pages:
-            if page['pageid'] not in seen_ids:
-                seen_ids.add(page['pageid'])
-                unique_pages.append(page)
-
-        self.stdout.write(f'Found {len(unique_pages)} unique pages to process')
-
-        created_count = 0
-        updated_count = 0
         skipped_count = 0
-
-        for i, page in enumerate(unique_pages, 1):
+        resumed_count = 0
+
+        def candidates():
+            """
+            Stream category members, de-duplicating by page ID as they arrive
+            and skipping finished and non-car pages before fetching them.
+            """
+            nonlocal skipped_count, resumed_count
+            seen_ids = set()
+            for page in self.iter_pages(categories, start_category, start_continue):
+                if page['pageid'] in seen_ids:
+                    continue
+                seen_ids.add(page['pageid'])
+                if limit and len(seen_ids) > limit:
+                    return
+                if checkpoint.is_finished(page['pageid']):
+                    resumed_count += 1
+                    continue
+                checkpoint.begin(page)
+                if ':' in page['title'] or page['title'].startswith('List of'):
+                    skipped_count += 1
+                    checkpoint.finish(page['pageid'], 'skipped')
+                else:
+                    yield page
+
+        def committed(page_ids):
+            for page_id in page_ids:
+                checkpoint.finish(page_id, 'done')
+            checkpoint.save()
+
+        writer = CarWriter('wikipedia', on_flush=committed)
+
+        results = iter_page_contents(
+            candidates(),
+            client=self.client,
+            cache=self.cache,
+            refresh=options['refresh'],
+            batch_size=options['batch_size'],
+            on_error=lambda title, e: self.stderr.write(f'Error fetching {title}: {e}'),
+        )
+        for i, (page, revision) in enumerate(results, 1):
             page_id = page['pageid']
             title = page['title']
+            content = revision.content if revision else None
 
-            # Skip non-car pages
-            if ':' in title or title.startswith('List of'):
-                skipped_count += 1
-                continue
-
-            # Check if already exists in database
-            existing = Car.objects.filter(wikipedia_page_id=page_id).first()
-
-            # Fetch page content
-            content = self.fetch_page_content(title)
             if not content:
                 skipped_count += 1
+                checkpoint.finish(page_id, 'failed')
                 continue
 
             # Parse car data from wiki content
             car_data = self.parse_car_data(title, content)
             if not car_data.get('brand') or not car_data.get('name'):
                 skipped_count += 1
+                checkpoint.finish(page_id, 'skipped')
                 continue
 
-            car_data['wikipedia_page_id'] = page_id
-            car_data['data_source'] = 'wikipedia'
-
-            if existing:
-                for key, value in car_data.items():
-                    if value:  # Only update non-empty values
-                        setattr(existing, key, value)
-                existing.save()
-                updated_count += 1
-            else:
-                Car.objects.create(**car_data)
-                created_count += 1
+            # Queue the car and its generation for the next batched write;
+            # pages are marked done in the checkpoint once it commits
+            car_fields, generations = self.car_rows(car_data)
+            writer.add(page_id, {**car_fields, 'wiki_revision_id': revision.revid}, generations)
 
             # Progress indicator
             if i % 25 == 0:
-                self.stdout.write(f'Processed {i}/{len(unique_pages)} pages... (Created: {created_count}, Updated: {updated_count})')
-
+                self.stdout.write(f'Processed {i} pages... (Created: {writer.created}, Updated: {writer.updated})')
+
+        writer.close()
+        if self.listing_failed:
+            # Keep the checkpoint so --resume continues from where listing stopped
+            checkpoint.save()
+            raise CommandError(
+                f'Listing pages failed after Created: {writer.created}, Updated: {writer.updated}; '
+                f'run again with --resume to continue'
+            )
+        checkpoint.delete()
+        import_finished.send(sender=self.__class__)
+        if resumed_count:
+            self.stdout.write(f'Resumed: {resumed_count} pages were already finished by the previous run')
         self.stdout.write(self.style.SUCCESS(
-            f'Done! Created: {created_count}, Updated: {updated_count}, Skipped: {skipped_count}'
+            f'Done! Created: {writer.created}, Updated: {writer.updated}, Skipped: {skipped_count}'
         ))
 
-    def fetch_category_pages(self, category, limit=0):
-        """Fetch pages from a Wikipedia category."""
-        pages = []
-        cmcontinue = None
+    def iter_pages(self, categories, start_category=None, start_continue=None):
+        """
+        Yield pages from each category in turn, or from the cache when
+        offline. The start category resumes from its continuation token.
+        """
+        if not self.client:
+            self.stdout.write('Streaming car pages from cache...')
+            yield from self.cache.pages()
+            return
+
+        self.stdout.write('Streaming car pages from Wikipedia...')
+        for category in categories:
+            self.stdout.write(f'Fetching category: {category}')
+            yield from self.fetch_category_pages(
+                category,
+                cmcontinue=start_continue if category == start_category else None,
+            )
+            # Later categories would move the resume token past the gap
+            if self.listing_failed:
+                return
+
+    def fetch_category_pages(self, category, limit=0, cmcontinue=None):
+        """
+        Yield pages from a Wikipedia category as each API batch arrives,
+        optionally starting from a continuation token. Each page records
+        [category, token] of its batch.
+        """
+        count = 0
 
         while True:
             params = {
@@ -164,50 +223,28 @@ class Command(BaseCommand):
                 'cmtitle': f'Category:{category}',
                 'cmlimit': 500,
                 'cmtype': 'page',
-                'format': 'json',
             }
             if cmcontinue:
                 params['cmcontinue'] = cmcontinue
 
             try:
-                response = requests.get(self.BASE_URL, params=params, headers=self.HEADERS, timeout=30)
-                response.raise_for_status()
-                data = response.json()
+                data = self.client.get(params)
             except requests.RequestException as e:
                 self.stderr.write(f'Error fetching category {category}: {e}')
-                break
-
-            batch = data.get('query', {}).get('categorymembers', [])
-            pages.extend(batch)
+                self.listing_failed = True
+                return
 
-            if limit and len(pages) >= limit:
-                pages = pages[:limit]
-                break
+            for page in data.get('query', {}).get('categorymembers', []):
+                yield {**page, 'continue': [category, cmcontinue]}
+                count += 1
+                if limit and count >= limit:
+                    return
 
             # Check for continuation
             if 'continue' in data:
                 cmcontinue = data['continue'].get('cmcontinue')
             else:
-                break
-
-        return pages
-
-    def fetch_page_content(self, title):
-        """Fetch the wikitext content of a page."""
-        params = {
-            'action': 'parse',
-            'page': title,
-            'format': 'json',
-            'prop': 'wikitext',
-        }
-
-        try:
-            response = requests.get(self.BASE_URL, params=params, headers=self.HEADERS, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            return data.get('parse', {}).get('wikitext', {}).get('*', '')
-        except requests.RequestException:
-            return None
+                return
 
     def parse_car_data(self, title, content):
         """Parse car specs from Wikipedia content with Infobox automobile."""
@@ -227,15 +264,11 @@ class Command(BaseCommand):
             'generation_years': '',
         }
 
-        # Extract infobox automobile data
-        infobox_match = re.search(
-            r'\{\{[Ii]nfobox\s+automobile[^}]*?\n(.*?)\n\}\}',
-            content,
-            re.DOTALL | re.IGNORECASE
-        )
+        document = wikitext.parse(content)
 
-        if infobox_match:
-            infobox = infobox_match.group(1)
+        # Extract infobox automobile data
+        infobox = document.find_template('Infobox automobile')
+        if infobox is not None:
             data.update(self.parse_infobox(infobox))
 
         # Parse brand and name from title if not found in infobox
@@ -248,35 +281,46 @@ class Command(BaseCommand):
 
         # Extract description from content
         if not data['description']:
-            data['description'] = self.extract_description(content)
+            data['description'] = self.extract_description(document)
 
         return data
 
+    def car_rows(self, data):
+        """Split parse_car_data() output into Car fields and a list of generation fields."""
+        car_fields = {
+            'name': data['name'][:200],
+            'brand': data['brand'][:100],
+            'description': data['description'],
+            'body_style': data['body_style'][:100],
+            'production_years': data['generation_years'][:100],
+        }
+        # The infobox describes one generation; without any specs the car's
+        # current generations are left alone
+        if not (data['year'] or data['engine'] or data['horsepower'] or data['transmission']):
+            return car_fields, []
+        generation = {
+            'name': data['generation_years'][:100],
+            'code': data['generation_code'][:50],
+            'year_start': data['year'],
+            'engine': data['engine'][:300],
+            'horsepower': f"{data['horsepower']} hp" if data['horsepower'] else '',
+            'transmission': data['transmission'][:200],
+        }
+        return car_fields, [generation]
+
     def parse_infobox(self, infobox):
-        """Parse fields from the infobox content."""
+        """Parse fields from the parsed infobox template."""
         data = {}
 
-        # Field mappings: infobox field -> model field
-        field_patterns = {
-            'name': r'\|\s*name\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'manufacturer': r'\|\s*manufacturer\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'production': r'\|\s*production\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'model_years': r'\|\s*model_years\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'engine': r'\|\s*engine\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'transmission': r'\|\s*transmission\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'body_style': r'\|\s*body_style\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'class': r'\|\s*class\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'wheelbase': r'\|\s*wheelbase\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'length': r'\|\s*length\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'width': r'\|\s*width\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'height': r'\|\s*height\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-            'curb_weight': r'\|\s*curb_weight\s*=\s*(.+?)(?=\n\||\n\}\}|$)',
-        }
+        # Infobox fields used, in order (production takes precedence over model_years)
+        fields = [
+            'name', 'manufacturer', 'production', 'model_years',
+            'engine', 'transmission', 'body_style',
+        ]
 
-        for field, pattern in field_patterns.items():
-            match = re.search(pattern, infobox, re.IGNORECASE | re.DOTALL)
-            if match:
-                value = self.clean_wiki_markup(match.group(1).strip())
+        for field in fields:
+            if field in infobox.params:
+                value = self.clean_wiki_markup(infobox.params[field])
                 if value:
                     if field == 'manufacturer':
                         data['brand'] = value[:100]
@@ -356,9 +400,8 @@ class Command(BaseCommand):
         if not text:
             return ''
 
-        # Remove nested templates (simple approach)
-        while '{{' in text and '}}' in text:
-            text = re.sub(r'\{\{[^{}]*\}\}', '', text)
+        # Remove templates, however deeply nested
+        text = wikitext.strip_templates(text)
 
         # Remove wikilinks but keep display text
         text = re.sub(r'\[\[(?:[^|\]]+\|)?([^\]]+)\]\]', r'\1', text)
@@ -381,17 +424,10 @@ class Command(BaseCommand):
 
         return text
 
-    def extract_description(self, content):
+    def extract_description(self, document):
         """Extract first paragraph as description."""
-        # Remove infoboxes and templates at the start
-        content = re.sub(r'^\s*\{\{[^}]+\}\}\s*', '', content, flags=re.DOTALL)
-
-        # Remove all templates
-        while '{{' in content:
-            prev_content = content
-            content = re.sub(r'\{\{[^{}]*\}\}', '', content)
-            if content == prev_content:
-                break
+        # Remove infoboxes and all other templates
+        content = document.strip_templates()
 
         # Remove references
         content = re.sub(r'<ref[^>]*>.*?</ref>', '', content, flags=re.DOTALL)
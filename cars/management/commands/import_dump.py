@@ -0,0 +1,155 @@
+import bz2
+import gzip
+import time
+from xml.etree.ElementTree import iterparse
+from django.core.management.base import BaseCommand, CommandError
+from cars.management.autopedia import parse_pages, should_skip
+from cars.management.mediawiki import Revision, iter_parsed
+from cars.management.writer import CarWriter
+from cars.signals import import_finished
+
+
+def open_dump(path):
+    """Open a MediaWiki XML dump, decompressing .bz2/.gz files on the fly."""
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def local_name(tag):
+    """Strip the export schema namespace from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_dump_pages(stream):
+    """
+    Yield {'pageid', 'title', 'ns', 'revid', 'text', 'redirect'} for each
+    <page> in a MediaWiki XML export, keeping only the last revision.
+
+    Elements are cleared as soon as each page is read, so memory stays
+    constant regardless of dump size.
+    """
+    context = iterparse(stream, events=('start', 'end'))
+    _, root = next(context)
+    page = None
+    revision = None
+
+    for event, elem in context:
+        tag = local_name(elem.tag)
+        if event == 'start':
+            if tag == 'page':
+                page = {'pageid': None, 'title': '', 'ns': 0, 'revid': None, 'text': '', 'redirect': False}
+            elif tag == 'revision':
+                revision = {}
+            continue
+
+        if page is None:
+            continue
+        if tag == 'revision':
+            page['revid'] = revision.get('id')
+            page['text'] = revision.get('text', '')
+            revision = None
+        elif revision is not None:
+            if tag == 'id' and 'id' not in revision:
+                revision['id'] = int(elem.text)
+            elif tag == 'text':
+                revision['text'] = elem.text or ''
+        elif tag == 'title':
+            page['title'] = elem.text or ''
+        elif tag == 'ns':
+            page['ns'] = int(elem.text or 0)
+        elif tag == 'id':
+            page['pageid'] = int(elem.text)
+        elif tag == 'redirect':
+            page['redirect'] = True
+        elif tag == 'page':
+            yield page
+            page = None
+            root.clear()
+
+
+class Command(BaseCommand):
+    # Pages are parsed with the Autopedia infobox parser, so they are
+    # stored as Autopedia cars
+    help = 'Import car data from an Autopedia XML dump (optionally .bz2 or .gz compressed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dump',
+            type=str,
+            help='Path to the XML export, e.g. autopedia_pages_current.xml.bz2'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='Limit number of article pages to read (0 = all)'
+        )
+        parser.add_argument(
+            '--parse-workers',
+            type=int,
+            default=1,
+            help='Number of processes parsing wikitext (default: 1, parse in this process)'
+        )
+        parser.add_argument(
+            '--write-batch',
+            type=int,
+            default=500,
+            help='Number of cars written per database transaction'
+        )
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        writer = CarWriter('autopedia', batch_size=options['write_batch'])
+
+        read = 0
+        skipped = 0
+        started = time.monotonic()
+
+        try:
+            stream = open_dump(options['dump'])
+        except OSError as e:
+            raise CommandError(f"Cannot open dump: {e}")
+
+        def articles():
+            """Yield (page, Revision) for car articles, skipping everything else."""
+            nonlocal read, skipped
+            for page in iter_dump_pages(stream):
+                # Only articles; templates, users, files etc. live in other namespaces
+                if page['ns'] != 0 or page['redirect']:
+                    continue
+                read += 1
+                if read % 1000 == 0:
+                    self.stdout.write(f"Read {read} pages... (Created: {writer.created}, Updated: {writer.updated})")
+
+                if not page['text'] or should_skip(page['title']):
+                    skipped += 1
+                else:
+                    yield page, Revision(page.pop('revid'), page.pop('text'))
+                if limit and read >= limit:
+                    return
+
+        with stream:
+            parsed = iter_parsed(parse_pages, articles(), workers=options['parse_workers'])
+            for page, revision, car_data in parsed:
+                if not car_data:
+                    skipped += 1
+                    continue
+                writer.add(
+                    page['pageid'],
+                    {**car_data['car'], 'wiki_revision_id': revision.revid},
+                    car_data['generations'],
+                )
+
+        writer.close()
+        import_finished.send(sender=self.__class__)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Read {read} pages in {elapsed:.1f}s; wrote {writer.rows} rows "
+            f"({writer.rows_per_second:.0f} rows/sec)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone! Created: {writer.created}, Updated: {writer.updated}, Skipped: {skipped}"
+        ))
@@ -0,0 +1,97 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from cars import images
+from cars.management.mediawiki import RateLimiter, map_in_order
+from cars.models import GALLERY_ANGLES, Car, Generation
+
+
+class Command(BaseCommand):
+    help = 'Download every car image angle once and store its resized variants under MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent downloads (default: 4)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=5.0,
+            help='Maximum image requests per second across all workers (0 = unlimited)'
+        )
+        parser.add_argument(
+            '--angles',
+            nargs='+',
+            choices=GALLERY_ANGLES,
+            default=GALLERY_ANGLES,
+            help='Angles to fetch (default: all gallery angles; 01 is the card image)'
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Download again even when all variants are already stored'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        session = requests.Session()
+        pool_size = max(1, options['workers'])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        limiter = RateLimiter(options['rate'])
+
+        def fetch(job):
+            base_url, angle = job
+            limiter.acquire()
+            try:
+                images.fetch_variants(base_url, angle, session=session)
+            except images.ImageFetchError as e:
+                return e
+            return None
+
+        jobs = list(self.pending_jobs(options['angles'], options['refresh']))
+        self.stdout.write(f"{len(jobs)} images to fetch")
+
+        fetched = 0
+        failed = 0
+        for (base_url, angle), error in map_in_order(fetch, jobs, workers=options['workers']):
+            if error:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"  Failed: {error}"))
+            else:
+                fetched += 1
+            if (fetched + failed) % 50 == 0:
+                self.stdout.write(f"Processed {fetched + failed}/{len(jobs)} images...")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone! Fetched: {fetched}, Failed: {failed} in {elapsed:.1f}s"
+        ))
+
+    def pending_jobs(self, angles, refresh):
+        """Yield (base_url, angle) once per distinct image that is not fully stored."""
+        first_generation = Generation.objects.filter(car=OuterRef('pk')).order_by('-year_start')
+        cars = Car.objects.annotate(
+            first_generation_year=Subquery(first_generation.values('year_start')[:1])
+        ).only('brand', 'name')
+        generations = Generation.objects.select_related('car').only('year_start', 'car__brand', 'car__name')
+
+        seen = set()
+        for queryset in (cars, generations):
+            for obj in queryset.iterator(chunk_size=2000):
+                base_url = obj.image_base_url
+                if not base_url:
+                    continue
+                key = images.image_key(base_url)
+                if key in seen:
+                    continue
+                seen.add(key)
+                for angle in angles:
+                    if refresh or not images.has_variants(key, angle):
+                        yield base_url, angle
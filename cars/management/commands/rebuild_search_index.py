@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from cars import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from all cars and generations'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('The search index needs SQLite with FTS5; run migrate first')
+        started = time.monotonic()
+        indexed = search.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Done! Indexed {indexed} cars in {elapsed:.1f}s"))
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cars.caching import bump_catalog_version
+from cars.models import Car
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalised min_year/max_year of every car from its generations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of cars updated per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        updated = 0
+        last_pk = 0
+        started = time.monotonic()
+
+        # Page by primary key so each batch is an index range scan, however far in
+        while True:
+            pks = list(
+                Car.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Car.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update_year_ranges()
+            last_pk = pks[-1]
+            self.stdout.write(f"Updated {updated} cars...")
+
+        # Cached pages, facets and ETags still show the old years
+        if updated:
+            bump_catalog_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"\nDone! Updated: {updated} in {elapsed:.1f}s"))
@@ -0,0 +1,294 @@
+"""
+Shared helpers for the MediaWiki import commands.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# MediaWiki accepts at most 50 titles/pageids per query for normal clients
+MAX_BATCH_SIZE = 50
+
+Revision = namedtuple('Revision', ['revid', 'content'])
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all fetch workers."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request token is available (no-op when rate <= 0)."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def map_in_order(func, items, workers=1, executor_class=ThreadPoolExecutor):
+    """
+    Run func over items on a bounded pool, yielding (item, result) pairs in
+    input order so a single consumer can do the DB writes. At most
+    2 * workers items are in flight, so items may be a lazy stream.
+    """
+    workers = max(1, workers)
+    window = deque()
+    with executor_class(max_workers=workers) as executor:
+        for item in items:
+            window.append((item, executor.submit(func, item)))
+            if len(window) >= workers * 2:
+                item, future = window.popleft()
+                yield item, future.result()
+        while window:
+            item, future = window.popleft()
+            yield item, future.result()
+
+
+def chunked(items, size):
+    """Yield lists of up to size items from any iterable."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class MediaWikiClient:
+    """
+    Pooled, retrying client for a MediaWiki api.php endpoint.
+
+    One keep-alive requests.Session is shared by all worker threads. Every
+    request passes through the rate limiter, sends maxlag, and is retried
+    with exponential backoff on connection errors, 429/5xx responses and
+    maxlag errors, honouring any Retry-After header the server sends.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, headers=None, pool_size=10, limiter=None,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, maxlag=5, timeout=30):
+        self.base_url = base_url
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.maxlag = maxlag
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, params):
+        """Perform an API GET and return the decoded JSON response."""
+        params = {'format': 'json', **params}
+        if self.maxlag:
+            params.setdefault('maxlag', self.maxlag)
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            if response.status_code in self.RETRY_STATUSES and not last_attempt:
+                time.sleep(self._backoff_delay(attempt, response))
+                continue
+            response.raise_for_status()
+
+            data = response.json()
+            if data.get('error', {}).get('code') == 'maxlag':
+                if last_attempt:
+                    raise requests.RequestException(data['error'].get('info', 'maxlag'))
+                time.sleep(self._backoff_delay(attempt, response))
+                continue
+            return data
+
+    def fetch_wikitext(self, title):
+        """Fetch the current Revision of a single page via action=parse."""
+        data = self.get({
+            'action': 'parse',
+            'page': title,
+            'prop': 'wikitext|revid',
+        })
+        parse = data.get('parse', {})
+        return Revision(parse.get('revid'), parse.get('wikitext', {}).get('*', ''))
+
+    def fetch_latest_revids(self, page_ids):
+        """Return {pageid: lastrevid} for up to 50 pages without their content."""
+        data = self.get({
+            'action': 'query',
+            'prop': 'info',
+            'pageids': '|'.join(str(page_id) for page_id in page_ids),
+            'formatversion': 2,
+        })
+        return {
+            page['pageid']: page['lastrevid']
+            for page in data.get('query', {}).get('pages', [])
+            if 'lastrevid' in page
+        }
+
+    def fetch_wikitext_batch(self, page_ids):
+        """
+        Fetch the current wikitext of up to 50 pages in one request.
+
+        Returns a {pageid: Revision} dict. Pages that come back missing, or
+        without content because the response was truncated, are left out so
+        the caller can fall back to fetching them one at a time.
+        """
+        data = self.get({
+            'action': 'query',
+            'prop': 'revisions',
+            'rvprop': 'ids|content',
+            'rvslots': 'main',
+            'pageids': '|'.join(str(page_id) for page_id in page_ids),
+            'formatversion': 2,
+        })
+
+        contents = {}
+        for page in data.get('query', {}).get('pages', []):
+            if page.get('missing') or page.get('invalid'):
+                continue
+            revisions = page.get('revisions') or []
+            if not revisions:
+                continue
+            slot = revisions[0].get('slots', {}).get('main', revisions[0])
+            content = slot.get('content', slot.get('*'))
+            if content is not None:
+                contents[page['pageid']] = Revision(revisions[0].get('revid'), content)
+        return contents
+
+    def _backoff_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt, preferring Retry-After."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def iter_page_contents(pages, client=None, cache=None, refresh=False,
+                       workers=1, batch_size=MAX_BATCH_SIZE, on_error=None):
+    """
+    Yield (page, Revision) for each page in input order.
+
+    Pages are fetched in batches; anything a batch did not return is
+    retried one title at a time. Batches run on a bounded thread pool.
+
+    With a cache, each batch first looks up the pages' latest revision IDs
+    (taken from a page's 'revid' key when the enumeration already knows
+    it) and only downloads pages whose cached revision is stale, or all of
+    them when refresh is set. Without a client the cache is read as-is and
+    nothing touches the network. Pages that cannot be fetched yield None
+    and are reported through on_error(title, exc).
+    """
+    def fetch(batch):
+        page_ids = [page['pageid'] for page in batch]
+        revisions = {}
+
+        if cache and not refresh:
+            revids = {page['pageid']: page['revid'] for page in batch if page.get('revid')}
+            if client and len(revids) < len(batch):
+                try:
+                    revids.update(client.fetch_latest_revids(
+                        [page_id for page_id in page_ids if page_id not in revids]
+                    ))
+                except (requests.RequestException, ValueError):
+                    pass
+            for page_id in page_ids:
+                if client and page_id not in revids:
+                    continue
+                revision = cache.get(page_id, revids.get(page_id))
+                if revision is not None:
+                    revisions[page_id] = revision
+
+        missing = [page for page in batch if page['pageid'] not in revisions]
+        if client and missing:
+            try:
+                fetched = client.fetch_wikitext_batch([page['pageid'] for page in missing])
+            except (requests.RequestException, ValueError):
+                fetched = {}
+            for page in missing:
+                revision = fetched.get(page['pageid'])
+                if revision is None:
+                    try:
+                        revision = client.fetch_wikitext(page['title'])
+                    except (requests.RequestException, ValueError) as e:
+                        if on_error:
+                            on_error(page['title'], e)
+                        continue
+                revisions[page['pageid']] = revision
+                if cache and revision.content:
+                    cache.put(page['pageid'], revision.revid, page['title'], revision.content)
+
+        return [(page, revisions.get(page['pageid'])) for page in batch]
+
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    for _, results in map_in_order(fetch, chunked(pages, batch_size), workers):
+        yield from results
+
+
+def iter_parsed(parse_batch, items, workers=1, chunk_size=50):
+    """
+    Yield parse_batch results for items, in order and in chunks.
+
+    With more than one worker the chunks are parsed in a process pool, so
+    CPU-bound parsing is not limited to one core by the GIL. Workers are
+    spawned rather than forked because fetch threads may be running, so
+    parse_batch must be a module-level function in a module that imports
+    without Django being set up.
+    """
+    chunks = chunked(items, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from parse_batch(chunk)
+        return
+    executor_class = partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+    for _, results in map_in_order(parse_batch, chunks, workers, executor_class=executor_class):
+        yield from results
@@ -0,0 +1,138 @@
+"""
+On-disk cache of raw wikitext for the MediaWiki import commands.
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from django.core.management.base import CommandError
+
+from cars.management.mediawiki import Revision
+
+
+class WikitextCache:
+    """
+    SQLite store of compressed wikitext keyed by page ID and revision ID.
+
+    Only the newest cached revision of each page is kept. When the total
+    compressed size exceeds max_bytes, the least recently used pages are
+    evicted. Safe to share between fetch worker threads.
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' pageid INTEGER PRIMARY KEY,'
+            ' revid INTEGER,'
+            ' title TEXT NOT NULL,'
+            ' content BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, pageid, revid=None):
+        """Return the cached Revision, or None if missing or not at revid."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT revid, content FROM pages WHERE pageid = ?', (pageid,)
+            ).fetchone()
+            if row is None or (revid is not None and row[0] != revid):
+                return None
+            self.conn.execute('UPDATE pages SET accessed = ? WHERE pageid = ?', (time.time(), pageid))
+            self.conn.commit()
+        return Revision(row[0], zlib.decompress(row[1]).decode('utf-8'))
+
+    def put(self, pageid, revid, title, content):
+        """Store wikitext for a page, replacing any older revision."""
+        blob = zlib.compress(content.encode('utf-8'))
+        with self.lock:
+            old = self.conn.execute('SELECT size FROM pages WHERE pageid = ?', (pageid,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages (pageid, revid, title, content, size, accessed)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (pageid, revid, title, blob, len(blob), time.time()),
+            )
+            self.total_bytes += len(blob) - (old[0] if old else 0)
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def pages(self, chunk_size=1000):
+        """Yield {'pageid', 'title', 'revid'} for every cached page, in page ID order."""
+        last = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT pageid, title, revid FROM pages WHERE pageid > ? ORDER BY pageid LIMIT ?',
+                    (last, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for pageid, title, revid in rows:
+                yield {'pageid': pageid, 'title': title, 'revid': revid}
+            last = rows[-1][0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _evict(self):
+        """Drop least recently used pages until the cache is at 90% of its budget."""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT pageid, size FROM pages ORDER BY accessed').fetchall()
+        evicted = []
+        for pageid, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((pageid,))
+            self.total_bytes -= size
+        self.conn.executemany('DELETE FROM pages WHERE pageid = ?', evicted)
+
+
+def add_cache_arguments(parser):
+    """Register the --cache-dir/--cache-size/--offline/--refresh options."""
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default='',
+        help='Directory for the on-disk wikitext cache (disabled if empty)',
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=1024,
+        help='Maximum cache size in MB before least recently used pages are evicted',
+    )
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Import only from the cache without touching the network',
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Ignore cached wikitext and re-download every page',
+    )
+
+
+def cache_from_options(options, name):
+    """Open the cache named by --cache-dir, or return None when disabled."""
+    if not options['cache_dir']:
+        if options['offline']:
+            raise CommandError('--offline requires --cache-dir')
+        return None
+    if options['offline'] and options['refresh']:
+        raise CommandError('--offline and --refresh cannot be combined')
+    path = Path(options['cache_dir']) / f'{name}.sqlite3'
+    return WikitextCache(path, max_bytes=options['cache_size'] * 1024 * 1024)
@@ -0,0 +1,263 @@
+"""
+Linear-time wikitext scanning shared by the import commands.
+
+parse() splits the text once at template braces and works out the nesting
+depth of every piece, which gives the outermost templates, the text with
+all templates removed, and the list of sections without rescanning.
+Template names and parameters are split on first access, so only the
+templates a caller actually inspects (usually just the infobox) pay for it.
+
+This replaces stripping innermost templates with re.sub until none remain,
+which rescans the whole article once per level of nesting. No Django
+imports, so it is safe to use from parse worker processes.
+"""
+import re
+from collections import namedtuple
+from itertools import compress
+from operator import not_
+
+PARAM_TOKEN_RE = re.compile(r'\{\{|\}\}|\[\[|\]\]|\|')
+HEADING_RE = re.compile(r'\n(={2,6})([^\n]+?)\1[ \t]*(?=\n|$)')
+BRACE_RUN_RE = re.compile(r'\{{2,}|\}{2,}')
+# Turns the stand-ins for the braces of {{{parameters}}} back into braces
+RESTORE_BRACES = str.maketrans('\x00\x01', '{}')
+
+Section = namedtuple('Section', ['level', 'title', 'text'])
+
+
+def normalize_key(key):
+    """Normalise a template name or parameter key: 'Body style ' -> 'body_style'."""
+    return '_'.join(key.split()).lower()
+
+
+class Template:
+    """A {{template}} spanning text[start:end]."""
+
+    __slots__ = ('text', 'start', 'end', '_name', '_params', '_children')
+
+    def __init__(self, text, start, end):
+        self.text = text
+        self.start = start
+        self.end = end
+        self._name = None
+        self._params = None
+        self._children = None
+
+    def __repr__(self):
+        return f'<Template {self.name!r} {self.start}:{self.end}>'
+
+    @property
+    def name(self):
+        if self._name is None:
+            self._split()
+        return self._name
+
+    @property
+    def params(self):
+        """Parameters keyed by normalised name; positional ones by '1', '2', ..."""
+        if self._params is None:
+            self._split()
+        return self._params
+
+    @property
+    def children(self):
+        """Templates nested directly inside this one."""
+        if self._children is None:
+            inner = self.text[self.start + 2:self.end - 2]
+            self._children = Document(inner, offset=self.start + 2, source=self.text).templates
+        return self._children
+
+    def get(self, key, default=''):
+        return self.params.get(normalize_key(key), default)
+
+    def _split(self):
+        """Split the template body at pipes not nested in other templates or links."""
+        inner_start = self.start + 2
+        inner_end = self.end - 2
+        bounds = [inner_start]
+        depth = 0
+        for match in PARAM_TOKEN_RE.finditer(self.text, inner_start, inner_end):
+            token = match.group()
+            if token == '|':
+                if not depth:
+                    bounds.append(match.end())
+            elif token[0] in '{[':
+                depth += 1
+            elif depth:
+                depth -= 1
+        bounds.append(inner_end + 1)
+        segments = [self.text[bounds[i]:bounds[i + 1] - 1] for i in range(len(bounds) - 1)]
+
+        params = {}
+        position = 0
+        for segment in segments[1:]:
+            key, sep, value = segment.partition('=')
+            if sep and '{{' not in key and '[[' not in key:
+                params[normalize_key(key)] = value.strip()
+            else:
+                position += 1
+                params[str(position)] = segment.strip()
+        self._name = segments[0].strip()
+        self._params = params
+
+
+class Document:
+    """
+    Parsed wikitext: outermost templates, template-free text and sections.
+
+    When text is a slice of a larger source starting at offset, templates
+    refer to positions in the source.
+    """
+
+    def __init__(self, text, offset=0, source=None):
+        self.text = text
+        self.offset = offset
+        self.source = text if source is None else source
+        self.pieces, self.depths = split_braces(text)
+        self._templates = None
+        self._sections = None
+
+    @property
+    def templates(self):
+        """Outermost templates, in order."""
+        if self._templates is None:
+            self._templates = list(self.iter_templates())
+        return self._templates
+
+    def iter_templates(self):
+        # Walk the pieces keeping the source offset of every open {{ on a
+        # stack; a template is complete when its }} empties the stack
+        opened = []
+        position = self.offset + len(self.pieces[0])
+        for k in range(1, len(self.pieces)):
+            if self.depths[k] > self.depths[k - 1]:
+                opened.append(position)
+            else:
+                start = opened.pop()
+                if not opened:
+                    yield Template(self.source, start, position + 2)
+            position += 2 + len(self.pieces[k])
+
+    @property
+    def sections(self):
+        """Section(level, title, text) for every heading, in order."""
+        if self._sections is None:
+            # Matching from the newline lets the regex engine skip to candidate lines
+            headings = list(HEADING_RE.finditer('\n' + self.text))
+            ends = [m.start() for m in headings[1:]] + [len(self.text)]
+            self._sections = [
+                Section(len(m.group(1)), m.group(2).strip(), self.text[m.end() - 1:end])
+                for m, end in zip(headings, ends)
+            ]
+        return self._sections
+
+    def find_template(self, *prefixes):
+        """Return the first outermost template whose name starts with any prefix."""
+        prefixes = tuple(normalize_key(prefix) for prefix in prefixes)
+        templates = self.iter_templates() if self._templates is None else self._templates
+        for template in templates:
+            if normalize_key(template.name).startswith(prefixes):
+                return template
+        return None
+
+    def strip_templates(self):
+        """Return the text with every template, however deeply nested, removed."""
+        return ''.join(compress(self.pieces, map(not_, self.depths)))
+
+
+def parse(text):
+    return Document(text)
+
+
+def strip_templates(text):
+    """Remove all templates from text in a single pass."""
+    if '{{' not in text:
+        return text
+    return Document(text).strip_templates()
+
+
+def split_braces(text):
+    """
+    Split text at every {{ and }}, returning the pieces between them and the
+    template nesting depth of each piece. Unmatched braces and the braces of
+    {{{parameters}}} are kept as text.
+    """
+    masked = mask_parameters(text)
+    if masked is not text:
+        pieces, depths = split_braces(masked)
+        return [piece.translate(RESTORE_BRACES) for piece in pieces], depths
+    pieces = []
+    depths = []
+    depth = 0
+    for i, chunk in enumerate(text.split('{{')):
+        if i:
+            depth += 1
+        closed = chunk.split('}}')
+        pieces += closed
+        depths += range(depth, depth - len(closed), -1)
+        depth -= len(closed) - 1
+    if depth or min(depths) < 0:
+        return balance(pieces, depths)
+    return pieces, depths
+
+
+def mask_parameters(text):
+    """
+    Replace the braces of {{{parameters}}} with stand-ins of the same length,
+    or return text itself when it has none.
+
+    Brace runs pair up as MediaWiki pairs them: a closing run is matched
+    against the innermost open run, three braces at a time for a parameter
+    when both runs have three left, otherwise two for a template. So
+    {{{1|{{{2}}}}}} is two parameters and {{{{{x}}}}} a template around one.
+    """
+    if '{{{' not in text:
+        return text
+    chars = None
+    opened = []
+    for match in BRACE_RUN_RE.finditer(text):
+        if match.group()[0] == '{':
+            opened.append([match.end(), len(match.group())])
+            continue
+        position, count = match.start(), len(match.group())
+        while count >= 2 and opened:
+            run = opened[-1]
+            size = 3 if count >= 3 and run[1] >= 3 else 2
+            if size == 3:
+                chars = chars or list(text)
+                chars[run[0] - 3:run[0]] = '\x00' * 3
+                chars[position:position + 3] = '\x01' * 3
+            run[0] -= size
+            run[1] -= size
+            position += size
+            count -= size
+            if run[1] < 2:
+                opened.pop()
+    return text if chars is None else ''.join(chars)
+
+
+def balance(pieces, depths):
+    """Fold unmatched braces back into the surrounding pieces and recompute depths."""
+    opened = []
+    unmatched = set()
+    for k in range(1, len(pieces)):
+        if depths[k] > depths[k - 1]:
+            opened.append(k)
+        elif opened:
+            opened.pop()
+        else:
+            unmatched.add(k)
+    unmatched.update(opened)
+
+    merged = [pieces[0]]
+    merged_depths = [0]
+    depth = 0
+    for k in range(1, len(pieces)):
+        opening = depths[k] > depths[k - 1]
+        if k in unmatched:
+            merged[-1] += ('{{' if opening else '}}') + pieces[k]
+        else:
+            depth += 1 if opening else -1
+            merged.append(pieces[k])
+            merged_depths.append(depth)
+    return merged, merged_depths
@@ -0,0 +1,120 @@
+"""
+Batched database writer for the import commands.
+"""
+import time
+
+from django.db import transaction
+
+from cars import search, signals
+from cars.caching import bump_catalog_version
+from cars.models import Car, Generation
+
+
+class CarWriter:
+    """
+    Buffers parsed cars and writes them in batches.
+
+    Each flush upserts every buffered Car with a single
+    bulk_create(update_conflicts=True) keyed on (data_source, wiki_page_id),
+    replaces the generations of those cars with one DELETE and one bulk
+    INSERT (with their normalised numeric specs filled in), recomputes
+    their year ranges, refreshes their full-text search rows, and runs
+    inside one transaction so SQLite syncs once per batch instead of once
+    per row.
+    After each commit the catalog version is bumped, so cached pages never
+    outlive a run that stops partway, and on_flush(page_ids) is called.
+    """
+
+    CAR_FIELDS = [
+        'name', 'brand', 'description', 'body_style', 'car_class',
+        'production_years', 'wiki_revision_id',
+    ]
+
+    def __init__(self, data_source, batch_size=200, on_flush=None):
+        self.data_source = data_source
+        self.batch_size = max(1, batch_size)
+        self.on_flush = on_flush
+        self.pending = {}
+        self.page_ids = dict(
+            Car.objects.filter(data_source=data_source, wiki_page_id__isnull=False)
+            .values_list('wiki_page_id', 'pk')
+        )
+        self.created = 0
+        self.updated = 0
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def add(self, page_id, car_fields, generations):
+        """
+        Queue a car and its generations, flushing when the batch is full.
+
+        Returns True if the car is new, False if it updates an existing row.
+        An empty generations list leaves the car's current generations alone.
+        """
+        is_new = page_id not in self.page_ids and page_id not in self.pending
+        if is_new:
+            self.created += 1
+        elif page_id not in self.pending:
+            self.updated += 1
+        self.pending[page_id] = (car_fields, generations)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return is_new
+
+    def flush(self):
+        """Write all buffered cars and generations in one transaction."""
+        if not self.pending:
+            return
+        started = time.monotonic()
+
+        cars = [
+            Car(wiki_page_id=page_id, data_source=self.data_source, **car_fields)
+            for page_id, (car_fields, _) in self.pending.items()
+        ]
+        # Search rows and year ranges are refreshed once per car below,
+        # not per deleted generation
+        with transaction.atomic(), signals.paused():
+            Car.objects.bulk_create(
+                cars,
+                update_conflicts=True,
+                unique_fields=['data_source', 'wiki_page_id'],
+                # updated_at is set by bulk_create (auto_now) on insert and update
+                update_fields=[*self.CAR_FIELDS, 'updated_at'],
+            )
+            new_ids = [page_id for page_id in self.pending if page_id not in self.page_ids]
+            if new_ids:
+                self.page_ids.update(
+                    Car.objects.filter(data_source=self.data_source, wiki_page_id__in=new_ids)
+                    .values_list('wiki_page_id', 'pk')
+                )
+
+            replaced = [page_id for page_id, (_, gens) in self.pending.items() if gens]
+            car_ids = [self.page_ids[page_id] for page_id in replaced]
+            Generation.objects.filter(car_id__in=car_ids).delete()
+            generations = [
+                Generation(car_id=self.page_ids[page_id], **gen_data)
+                for page_id in replaced
+                for gen_data in self.pending[page_id][1]
+            ]
+            # bulk_create skips save(), so fill the normalised specs here
+            for generation in generations:
+                generation.update_numeric_specs()
+            Generation.objects.bulk_create(generations)
+            Car.objects.filter(pk__in=car_ids).update_year_ranges()
+            search.index_cars(self.page_ids[page_id] for page_id in self.pending)
+        bump_catalog_version()
+
+        self.rows += len(cars) + len(generations)
+        self.elapsed += time.monotonic() - started
+        page_ids = list(self.pending)
+        self.pending = {}
+        if self.on_flush:
+            self.on_flush(page_ids)
+
+    def close(self):
+        """Flush anything still buffered."""
+        self.flush()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
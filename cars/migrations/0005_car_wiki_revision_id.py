@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_alter_car_options_remove_car_acceleration_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='wiki_revision_id',
+            field=models.PositiveIntegerField(blank=True, help_text='Last imported wiki revision', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0005_car_wiki_revision_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generation',
+            name='acceleration_s',
+            field=models.FloatField(blank=True, db_index=True, editable=False, help_text='0-100 km/h time in seconds (0-60 mph times are kept as quoted)', null=True),
+        ),
+        migrations.AddField(
+            model_name='generation',
+            name='horsepower_hp',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='generation',
+            name='top_speed_kmh',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='generation',
+            name='torque_nm',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
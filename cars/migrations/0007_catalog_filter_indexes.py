@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0006_generation_numeric_specs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['brand', 'name'], name='car_brand_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['body_style', 'brand', 'name'], name='car_body_style_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['car', 'horsepower_hp'], name='generation_car_hp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['car', 'top_speed_kmh'], name='generation_car_speed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['car', 'acceleration_s'], name='generation_car_accel_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_catalog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['car', 'year_start'], name='generation_car_year_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:50
+
+import cars.models
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.utils import OperationalError
+
+
+def create_search_table(apps, schema_editor):
+    """Create and fill the FTS5 table; skipped on other databases or SQLite without FTS5."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE cars_car_fts USING fts5("
+                "brand, name, description, car_class, generations, "
+                "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            return
+        cursor.execute(
+            "INSERT INTO cars_car_fts(cars_car_fts, rank) VALUES ('rank', 'bm25(10.0, 10.0, 1.0, 2.0, 4.0)')"
+        )
+        cursor.execute(
+            "INSERT INTO cars_car_fts(rowid, brand, name, description, car_class, generations) "
+            "SELECT c.id, c.brand, c.name, c.description, c.car_class, "
+            "COALESCE((SELECT group_concat(g.code || ' ' || g.engine, ' ') "
+            "FROM cars_generation g WHERE g.car_id = c.id), '') "
+            "FROM cars_car c"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS cars_car_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_generation_car_year_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarSearch',
+            fields=[
+                ('car', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='cars.car')),
+                ('brand', models.TextField()),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('car_class', models.TextField()),
+                ('generations', models.TextField(help_text='Generation codes and engines')),
+                ('document', cars.models.SearchDocumentField(db_column='cars_car_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'cars_car_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
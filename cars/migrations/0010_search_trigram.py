@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('word', models.CharField(max_length=100)),
+                ('word_trigrams', models.PositiveSmallIntegerField(help_text='Number of distinct trigrams in the word')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'word', 'word_trigrams'], name='searchtrigram_lookup_idx')],
+            },
+        ),
+    ]
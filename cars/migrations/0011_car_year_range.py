@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:05
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_year_ranges(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+    Generation = apps.get_model('cars', 'Generation')
+    generations = Generation.objects.filter(car=OuterRef('pk')).order_by().values('car')
+    Car.objects.update(
+        min_year=Subquery(generations.annotate(year=Min('year_start')).values('year')),
+        max_year=Subquery(generations.annotate(year=Max(Coalesce('year_end', 'year_start'))).values('year')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_search_trigram'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_brand_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_body_style_idx',
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='max_year',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='min_year',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_year_ranges, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['brand', 'name', 'id', 'min_year', 'max_year'], name='car_brand_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['body_style', 'brand', 'name', 'id', 'min_year', 'max_year'], name='car_body_style_idx'),
+        ),
+    ]
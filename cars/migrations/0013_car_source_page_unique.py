@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='car',
+            name='wiki_page_id',
+            field=models.PositiveIntegerField(blank=True, help_text='Page ID on the data_source wiki', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='car',
+            constraint=models.UniqueConstraint(fields=('data_source', 'wiki_page_id'), name='car_source_page_unique'),
+        ),
+    ]
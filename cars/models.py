@@ -1,6 +1,42 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 from urllib.parse import quote
 
+from .specs import SPEC_FIELDS, numeric_specs
+
+IMAGE_CDN_URL = 'https://cdn.imagin.studio/getimage'
+# Camera angles shown in galleries (the first is the card/thumbnail angle)
+GALLERY_ANGLES = ['01', '09', '13', '17', '21', '25', '29']
+IMAGE_WIDTH = 800
+
+
+def image_base_url(brand, name, model_year):
+    """IMAGIN.Studio URL without the angle and width parameters, or None."""
+    if not (brand and name):
+        return None
+    return (
+        f"{getattr(settings, 'IMAGE_CDN_URL', IMAGE_CDN_URL)}"
+        f"?customer=demo"
+        f"&make={quote(brand)}"
+        f"&modelFamily={quote(name)}"
+        f"&modelYear={model_year}"
+        f"&zoomType=fullscreen"
+    )
+
+
+class CarQuerySet(models.QuerySet):
+    def update_year_ranges(self):
+        """Recompute min_year and max_year from the generations of these cars in one UPDATE."""
+        generations = Generation.objects.filter(car=OuterRef('pk')).order_by().values('car')
+        return self.update(
+            min_year=Subquery(generations.annotate(year=Min('year_start')).values('year')),
+            # A generation still in production counts up to its start year
+            max_year=Subquery(generations.annotate(year=Max(Coalesce('year_end', 'year_start'))).values('year')),
+        )
+
 
 class Car(models.Model):
     """Main car model - represents a car model (not a specific generation)."""
@@ -10,40 +46,57 @@ class Car(models.Model):
     body_style = models.CharField(max_length=100, blank=True)
     car_class = models.CharField(max_length=100, blank=True, help_text="e.g., Mid-size luxury SUV")
     production_years = models.CharField(max_length=100, blank=True, help_text="e.g., 2000-present")
-    wiki_page_id = models.PositiveIntegerField(null=True, blank=True, unique=True)
+    wiki_page_id = models.PositiveIntegerField(null=True, blank=True, help_text="Page ID on the data_source wiki")
+    wiki_revision_id = models.PositiveIntegerField(null=True, blank=True, help_text="Last imported wiki revision")
     data_source = models.CharField(max_length=50, default='manual')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Also set when its generations change")
+
+    # Year range of all generations, kept in step by CarWriter and cars.signals
+    min_year = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    max_year = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    objects = CarQuerySet.as_manager()
 
     class Meta:
         ordering = ['brand', 'name']
+        indexes = [
+            # Listing order plus the year range, so year-filtered pages scan
+            # the index in page order without reading the rows they skip
+            models.Index(fields=['brand', 'name', 'id', 'min_year', 'max_year'], name='car_brand_name_idx'),
+            models.Index(fields=['body_style', 'brand', 'name', 'id', 'min_year', 'max_year'], name='car_body_style_idx'),
+        ]
+        constraints = [
+            # Page IDs are only unique within one wiki
+            models.UniqueConstraint(fields=['data_source', 'wiki_page_id'], name='car_source_page_unique'),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.name}"
 
-    def get_image_url(self, angle='01'):
+    def get_model_year(self):
+        """Start year of the first (newest) generation, or 2020 if unknown."""
+        # List views annotate this in the main query to avoid a query per car
+        if hasattr(self, 'first_generation_year'):
+            return self.first_generation_year or 2020
+        gen = self.generations.first()
+        return gen.year_start if gen and gen.year_start else 2020
+
+    @cached_property
+    def image_base_url(self):
+        return image_base_url(self.brand, self.name, self.get_model_year())
+
+    def get_image_url(self, angle='01', width=IMAGE_WIDTH):
         """Get image URL from IMAGIN.Studio."""
-        if self.brand and self.name:
-            make = quote(self.brand)
-            model_family = quote(self.name)
-            # Get year from first generation if available
-            gen = self.generations.first()
-            model_year = gen.year_start if gen and gen.year_start else 2020
-            return (
-                f"https://cdn.imagin.studio/getimage"
-                f"?customer=demo"
-                f"&make={make}"
-                f"&modelFamily={model_family}"
-                f"&modelYear={model_year}"
-                f"&zoomType=fullscreen"
-                f"&angle={angle}"
-                f"&width=800"
-            )
+        if self.image_base_url:
+            return f"{self.image_base_url}&angle={angle}&width={width}"
         return None
 
     def get_gallery_images(self):
         """Get multiple image angles for gallery."""
-        angles = ['01', '09', '13', '17', '21', '25', '29']
-        return [self.get_image_url(angle) for angle in angles if self.get_image_url(angle)]
+        if not self.image_base_url:
+            return []
+        return [self.get_image_url(angle) for angle in GALLERY_ANGLES]
 
 
 class Generation(models.Model):
@@ -62,8 +115,27 @@ class Generation(models.Model):
     acceleration = models.CharField(max_length=100, blank=True, help_text="0-60 or 0-100 time")
     transmission = models.CharField(max_length=200, blank=True)
 
+    # Normalised specs parsed from the text fields above, for sorting and filtering
+    horsepower_hp = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    torque_nm = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    top_speed_kmh = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    acceleration_s = models.FloatField(
+        null=True, blank=True, editable=False, db_index=True,
+        help_text="0-100 km/h time in seconds (0-60 mph times are kept as quoted)"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['-year_start']
+        indexes = [
+            # Per-car spec lookups for catalog filtering and sorting
+            models.Index(fields=['car', 'horsepower_hp'], name='generation_car_hp_idx'),
+            models.Index(fields=['car', 'top_speed_kmh'], name='generation_car_speed_idx'),
+            models.Index(fields=['car', 'acceleration_s'], name='generation_car_accel_idx'),
+            # Each car's newest generation year for list pages, and year filters
+            models.Index(fields=['car', 'year_start'], name='generation_car_year_idx'),
+        ]
 
     def __str__(self):
         years = f"{self.year_start or '?'}-{self.year_end or 'present'}"
@@ -71,25 +143,84 @@ class Generation(models.Model):
             return f"{self.car.name} {self.name} ({years})"
         return f"{self.car.name} ({years})"
 
-    def get_image_url(self, angle='01'):
+    def save(self, *args, **kwargs):
+        self.update_numeric_specs()
+        super().save(*args, **kwargs)
+
+    def update_numeric_specs(self):
+        """Refresh the normalised spec fields from the text fields."""
+        values = {field: getattr(self, field) for field in SPEC_FIELDS}
+        for field, value in numeric_specs(values).items():
+            setattr(self, field, value)
+
+    @cached_property
+    def image_base_url(self):
+        return image_base_url(self.car.brand, self.car.name, self.year_start or 2020)
+
+    def get_image_url(self, angle='01', width=IMAGE_WIDTH):
         """Get image URL for this specific generation."""
-        if self.car.brand and self.car.name:
-            make = quote(self.car.brand)
-            model_family = quote(self.car.name)
-            model_year = self.year_start if self.year_start else 2020
-            return (
-                f"https://cdn.imagin.studio/getimage"
-                f"?customer=demo"
-                f"&make={make}"
-                f"&modelFamily={model_family}"
-                f"&modelYear={model_year}"
-                f"&zoomType=fullscreen"
-                f"&angle={angle}"
-                f"&width=800"
-            )
+        if self.image_base_url:
+            return f"{self.image_base_url}&angle={angle}&width={width}"
         return None
 
     def get_gallery_images(self):
         """Get multiple image angles for gallery."""
-        angles = ['01', '09', '13', '17', '21', '25', '29']
-        return [self.get_image_url(angle) for angle in angles if self.get_image_url(angle)]
+        if not self.image_base_url:
+            return []
+        return [self.get_image_url(angle) for angle in GALLERY_ANGLES]
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden FTS5 column named after its table, which full-text queries MATCH against."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class CarSearch(models.Model):
+    """
+    Row of the SQLite FTS5 full-text index over a car and its generations.
+
+    The virtual table is created by a migration and kept in sync by
+    cars.search; this model only lets car queries join it and order by rank.
+    """
+    car = models.OneToOneField(
+        Car, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING, related_name='search_entry'
+    )
+    brand = models.TextField()
+    name = models.TextField()
+    description = models.TextField()
+    car_class = models.TextField()
+    generations = models.TextField(help_text="Generation codes and engines")
+    document = SearchDocumentField(db_column='cars_car_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'cars_car_fts'
+
+
+class SearchTrigram(models.Model):
+    """
+    One trigram of a word in the fuzzy search vocabulary (brand, model name
+    and generation code words). Rebuilt by build_trigram_index.
+    """
+    trigram = models.CharField(max_length=3)
+    word = models.CharField(max_length=100)
+    word_trigrams = models.PositiveSmallIntegerField(help_text="Number of distinct trigrams in the word")
+
+    class Meta:
+        indexes = [
+            # Covers the per-trigram lookup and word grouping of a fuzzy match
+            models.Index(fields=['trigram', 'word', 'word_trigrams'], name='searchtrigram_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram!r} in {self.word}"
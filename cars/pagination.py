@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page starts just past the sort key of the last
+row shown, using a row-value comparison such as
+(brand, name, id) > ('Ford', 'Focus', 42). With an index on those columns
+SQLite seeks straight to the page, so page 500 costs the same as page 1,
+and no COUNT(*) is needed to render next/previous links.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import CharField, F, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def Row(*expressions):
+    return Func(*expressions, template='(%(expressions)s)', output_field=CharField())
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Return (direction, values) from a token, where direction is 'next' or 'prev'."""
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursor(token) from e
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(token)
+    # Values are bound as SQL parameters; only scalars can come from a real row
+    if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset in ascending order of key_fields, which must be
+    unique together (end with 'pk') and should match an index.
+
+    count_timeout enables page.count: the total, cached for that many
+    seconds per query, so it is approximate but costs one COUNT(*) per
+    distinct query and timeout rather than one per request.
+    """
+
+    def __init__(self, queryset, per_page, key_fields=('brand', 'name', 'pk'), count_timeout=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key_fields = list(key_fields)
+        self.count_timeout = count_timeout
+
+    def page(self, cursor=None):
+        """
+        Return the page for a cursor token (the first page when None).
+        Raises InvalidCursor for tokens that were not produced here.
+        """
+        queryset = self.queryset.order_by(*self.key_fields)
+        direction, values = decode_cursor(cursor, len(self.key_fields)) if cursor else ('next', None)
+        if values is not None:
+            key = Row(*(F(field) for field in self.key_fields))
+            position = Row(*(Value(value) for value in values))
+            if direction == 'next':
+                queryset = queryset.filter(GreaterThan(key, position))
+            else:
+                queryset = queryset.filter(LessThan(key, position)).reverse()
+
+        # One extra row tells whether there is another page in this direction
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if more or direction == 'prev':
+                next_cursor = encode_cursor('next', self.key_values(rows[-1]))
+            if values is not None and (more or direction == 'next'):
+                previous_cursor = encode_cursor('prev', self.key_values(rows[0]))
+        return CursorPage(rows, next_cursor, previous_cursor, self.count())
+
+    def key_values(self, obj):
+        # Rows are model instances, or dicts for values() querysets
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.key_fields]
+        return [getattr(obj, field) for field in self.key_fields]
+
+    def count(self):
+        if self.count_timeout is None:
+            return None
+        sql, params = self.queryset.query.sql_with_params()
+        key = 'cursor-count:' + hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, self.count_timeout)
+        return count
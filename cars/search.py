@@ -0,0 +1,156 @@
+"""
+Full-text car search backed by an SQLite FTS5 table.
+
+cars_car_fts (created by migration 0009) holds one row per car, rowid =
+car id, with its brand, name, description, class and the codes and
+engines of its generations. Matches are ranked with bm25, weighting brand
+and name highest, and every word is matched as a prefix so "merc amg"
+finds "Mercedes-AMG". The importers index the cars they write; model
+signals cover everything else.
+
+Queries never join the FTS table to cars_car: given a filter on an indexed
+car column, SQLite would drive the join from that index and run the
+full-text query once per car.
+
+On databases without FTS5, available() is False and callers fall back to
+substring matching.
+"""
+import json
+import re
+import threading
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import CarSearch
+
+TABLE = CarSearch._meta.db_table
+COLUMNS = ['brand', 'name', 'description', 'car_class', 'generations']
+
+WORD_RE = re.compile(r'\w+')
+
+# SQLite allows 999 bound parameters per statement on older builds
+CHUNK_SIZE = 500
+
+# Candidates ranked per search; they are passed to SQLite as one JSON list
+RANKED_MATCHES = 300
+
+SELECT_DOCUMENTS_SQL = """
+    SELECT c.id, c.brand, c.name, c.description, c.car_class,
+           COALESCE((SELECT group_concat(g.code || ' ' || g.engine, ' ')
+                     FROM cars_generation g WHERE g.car_id = c.id), '')
+    FROM cars_car c
+"""
+
+_local = threading.local()
+
+
+def available():
+    """Whether the FTS table exists on the default database."""
+    if connection.vendor != 'sqlite':
+        return False
+    if getattr(_local, 'available', None) is None:
+        _local.available = TABLE in connection.introspection.table_names()
+    return _local.available
+
+
+def match_expression(query):
+    """FTS5 query matching every word of query as a prefix, or None if it has no words."""
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, query):
+    """
+    Filter a Car queryset to its best full-text matches of query, best
+    first. Returns None if query has no words.
+
+    bm25 scores a match in time proportional to the number of matches, so
+    only RANKED_MATCHES candidates are ranked: cars matching in their brand
+    or name, then cars matching in any column, each taken in index order
+    and ordered by rank within their group.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return None
+    car_ids = best_matches(queryset, expression)
+    if not car_ids:
+        return queryset.none()
+    # Bound as two strings rather than one parameter per ID: a query with
+    # hundreds of parameters costs more to compile than to run
+    candidates = RawSQL("SELECT value FROM json_each(%s)", [json.dumps(car_ids)])
+    position = RawSQL("instr(%s, ',' || cars_car.id || ',')", [f",{','.join(map(str, car_ids))},"])
+    return queryset.filter(pk__in=candidates).order_by(position)
+
+
+def matching(queryset, query):
+    """
+    Filter a Car queryset to every full-text match of query, unranked.
+    Returns None if query has no words.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return None
+    return queryset.filter(pk__in=CarSearch.objects.filter(document__match=expression).values('car_id'))
+
+
+def best_matches(queryset, expression, limit=RANKED_MATCHES):
+    """IDs of up to limit cars of queryset matching expression, best first (see search())."""
+    sql = f"SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s"
+    params = []
+    if queryset.query.has_filters():
+        # The unary + stops SQLite looking the cars' IDs up in the index one
+        # by one; it scans the matches and checks each against the cars
+        cars_sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        sql += f" AND +rowid IN ({cars_sql})"
+    sql += " LIMIT %s"
+
+    car_ids = []
+    with connection.cursor() as cursor:
+        for match in (f'{{brand name}} : ({expression})', expression):
+            cursor.execute(sql, [match, *params, limit])
+            seen = set(car_ids)
+            rows = sorted((rank, rowid) for rowid, rank in cursor.fetchall() if rowid not in seen)
+            car_ids += [rowid for _, rowid in rows[:limit - len(car_ids)]]
+            if len(car_ids) >= limit:
+                break
+    return car_ids
+
+
+def index_cars(car_ids):
+    """Refresh the index rows of the given cars; ids of deleted cars are removed."""
+    if not available():
+        return
+    car_ids = list(car_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(car_ids), CHUNK_SIZE):
+            chunk = car_ids[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(
+                f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) "
+                f"{SELECT_DOCUMENTS_SQL} WHERE c.id IN ({placeholders})",
+                chunk
+            )
+
+
+def remove_missing():
+    """Drop index rows whose car no longer exists (after bulk deletes)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid NOT IN (SELECT id FROM cars_car)")
+
+
+def rebuild():
+    """Re-index every car and compact the index. Returns the number of rows."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) {SELECT_DOCUMENTS_SQL}")
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
@@ -0,0 +1,100 @@
+"""
+Keep the search indexes, denormalised year ranges, Car.updated_at and the
+catalog version (which invalidates cached pages, facets and suggestions)
+in step with the catalog.
+
+The receivers below follow edits made outside the importers (admin,
+shell, save()); the importers pause them and update each batch
+themselves. Indexes rebuilt from the whole catalog are refreshed when an
+importer sends import_finished.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import fuzzy, search
+from .caching import bump_catalog_version
+from .models import Car, Generation
+
+# Sent by the import commands when a run has written all its cars
+import_finished = Signal()
+
+_local = threading.local()
+
+
+@contextmanager
+def paused():
+    """Skip the per-row receivers while the caller updates the affected cars itself."""
+    previous = getattr(_local, 'paused', False)
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = previous
+
+
+def is_paused():
+    return getattr(_local, 'paused', False)
+
+
+def skip_generation(origin=None, **kwargs):
+    """
+    Skip the Generation receivers while paused, and for generations removed
+    by deleting their car, whose own receivers run once after the cascade.
+    """
+    if is_paused():
+        return True
+    if isinstance(origin, QuerySet):
+        return origin.model is Car
+    return isinstance(origin, Car)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def index_car(sender, instance, **kwargs):
+    if not is_paused():
+        search.index_cars([instance.pk])
+
+
+@receiver(post_save, sender=Generation)
+@receiver(post_delete, sender=Generation)
+def index_generation_car(sender, instance, **kwargs):
+    if not skip_generation(**kwargs):
+        search.index_cars([instance.car_id])
+
+
+@receiver(post_save, sender=Generation)
+@receiver(post_delete, sender=Generation)
+def update_generation_car(sender, instance, **kwargs):
+    if not skip_generation(**kwargs):
+        cars = Car.objects.filter(pk=instance.car_id)
+        cars.update_year_ranges()
+        cars.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def bump_version(sender, **kwargs):
+    if not is_paused():
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Generation)
+@receiver(post_delete, sender=Generation)
+def bump_generation_version(sender, **kwargs):
+    if not skip_generation(**kwargs):
+        bump_catalog_version()
+
+
+@receiver(import_finished)
+def rebuild_fuzzy_index(sender, **kwargs):
+    fuzzy.rebuild()
+
+
+@receiver(import_finished)
+def bump_version_after_import(sender, **kwargs):
+    bump_catalog_version()
@@ -0,0 +1,94 @@
+"""
+Unit-aware extraction of numeric specs from free-text generation fields.
+
+"300 hp (224 kW)" -> 300, "270 lb⋅ft (366 N⋅m)" -> 366, "155 mph" -> 249.
+Each parser looks for the preferred unit first and converts from the others
+only when it is missing, so values already quoted in the target unit are
+used as written. Plain functions with no Django imports.
+"""
+import re
+
+NUMBER = r'(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*'
+
+# (unit pattern, factor to the normalised unit), in order of preference
+POWER_UNITS = [
+    (r'(?:b|w)?hp\b', 1.0),
+    (r'(?:PS|cv|ch)\b', 0.98632),
+    (r'kW\b', 1.34102),
+]
+TORQUE_UNITS = [
+    (r'N[·⋅\- ]?m\b', 1.0),
+    (r'(?:lbf?[·⋅\- ]?ft|ft[·⋅\- ]?lbf?)\b', 1.35582),
+    (r'kgf?[·⋅\- ]?m\b', 9.80665),
+]
+SPEED_UNITS = [
+    (r'(?:km/h|kph|kmh)', 1.0),
+    (r'mph\b', 1.609344),
+]
+SECONDS_UNITS = [
+    (r'(?:s|sec|secs|seconds)\b', 1.0),
+]
+
+
+def compile_units(units):
+    return [(re.compile(NUMBER + unit, re.IGNORECASE), factor) for unit, factor in units]
+
+
+POWER_RES = compile_units(POWER_UNITS)
+TORQUE_RES = compile_units(TORQUE_UNITS)
+SPEED_RES = compile_units(SPEED_UNITS)
+SECONDS_RES = compile_units(SECONDS_UNITS)
+
+
+def extract(text, unit_res, low, high):
+    """Return the first value in the most preferred unit present, converted, or None."""
+    if not text:
+        return None
+    for pattern, factor in unit_res:
+        match = pattern.search(text)
+        if match:
+            value = float(match.group(1).replace(',', '')) * factor
+            # Discard figures that cannot be a real car's spec (years, typos)
+            return value if low <= value <= high else None
+    return None
+
+
+def parse_power(text):
+    """Power in hp."""
+    value = extract(text, POWER_RES, 1, 3000)
+    return round(value) if value is not None else None
+
+
+def parse_torque(text):
+    """Torque in N·m."""
+    value = extract(text, TORQUE_RES, 1, 5000)
+    return round(value) if value is not None else None
+
+
+def parse_top_speed(text):
+    """Top speed in km/h."""
+    value = extract(text, SPEED_RES, 1, 600)
+    return round(value) if value is not None else None
+
+
+def parse_acceleration(text):
+    """Acceleration time in seconds (0-100 km/h, or 0-60 mph as quoted)."""
+    value = extract(text, SECONDS_RES, 0.5, 60)
+    return round(value, 1) if value is not None else None
+
+
+# Text field -> (numeric field, parser)
+SPEC_FIELDS = {
+    'horsepower': ('horsepower_hp', parse_power),
+    'torque': ('torque_nm', parse_torque),
+    'top_speed': ('top_speed_kmh', parse_top_speed),
+    'acceleration': ('acceleration_s', parse_acceleration),
+}
+
+
+def numeric_specs(values):
+    """Map text spec values (a dict keyed by text field) to numeric field values."""
+    return {
+        numeric_field: parser(values.get(text_field, ''))
+        for text_field, (numeric_field, parser) in SPEC_FIELDS.items()
+    }
@@ -0,0 +1,171 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+Brands, models ("911" and "porsche 911") and generation codes are kept as
+normalised keys in one sorted list, so the suggestions for a prefix are
+the contiguous run of keys found with two bisects, without touching the
+database. Each process builds the index on its first lookup and rebuilds
+it in the background when the catalog version changes (see cars.caching).
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.db import connections
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .caching import catalog_version
+from .fuzzy import words
+from .models import Car, Generation
+
+BRAND, MODEL, GENERATION = range(3)
+KIND_NAMES = {BRAND: 'brand', MODEL: 'model', GENERATION: 'generation'}
+
+# Keys scanned per lookup before ranking; a prefix like "a" matches thousands
+SCAN_LIMIT = 200
+
+
+def normalize(text):
+    return ' '.join(words(text))
+
+
+class PrefixIndex:
+    """
+    Sorted keys with a parallel array of entry numbers. Entries are stored
+    column-wise in arrays (kind, brand number, car id, generation id) plus
+    the model name or generation code, and labels are only built for the
+    handful of entries a lookup returns.
+    """
+
+    def __init__(self):
+        self.brands = []
+        self.kinds = array('B')
+        self.brand_ids = array('H')
+        self.car_ids = array('I')
+        self.generation_ids = array('I')
+        self.texts = []
+        self.keys = []
+        self.entry_ids = array('I')
+
+    @classmethod
+    def from_catalog(cls):
+        index = cls()
+        pairs = []
+
+        def add(keys, kind, brand_id, text, car_id=0, generation_id=0):
+            entry_id = len(index.texts)
+            index.kinds.append(kind)
+            index.brand_ids.append(brand_id)
+            index.car_ids.append(car_id)
+            index.generation_ids.append(generation_id)
+            index.texts.append(text)
+            pairs.extend((key, entry_id) for key in keys if key)
+
+        brand_ids = {}
+        car_entries = {}
+        for pk, brand, name in Car.objects.values_list('pk', 'brand', 'name').iterator(chunk_size=5000):
+            if brand not in brand_ids:
+                brand_ids[brand] = len(index.brands)
+                index.brands.append(brand)
+                add([normalize(brand)], BRAND, brand_ids[brand], brand)
+            name_key = normalize(name)
+            car_entries[pk] = len(index.texts)
+            add({name_key, f"{normalize(brand)} {name_key}"}, MODEL, brand_ids[brand], name, pk)
+
+        generations = Generation.objects.exclude(code='').values_list('pk', 'car_id', 'code')
+        for pk, car_id, code in generations.iterator(chunk_size=5000):
+            # Cars written after the scan above (an import is running) are
+            # picked up by the rebuild their version bump triggers
+            car_entry = car_entries.get(car_id)
+            if car_entry is None:
+                continue
+            add([normalize(code)], GENERATION, index.brand_ids[car_entry], code, car_id, pk)
+            # Generation labels name their car
+            index.texts[-1] = (code, index.texts[car_entry])
+
+        pairs.sort()
+        index.keys = [key for key, _ in pairs]
+        index.entry_ids = array('I', (entry_id for _, entry_id in pairs))
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def label(self, entry_id):
+        kind = self.kinds[entry_id]
+        brand = self.brands[self.brand_ids[entry_id]]
+        if kind == BRAND:
+            return brand
+        if kind == MODEL:
+            return f"{brand} {self.texts[entry_id]}"
+        code, name = self.texts[entry_id]
+        return f"{code} · {brand} {name}"
+
+    def lookup(self, query, limit=10):
+        """
+        [(kind, label, car_id, generation_id)] for entries with a key
+        starting with query: brands, then models, then generations.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start, min(len(self.keys), start + SCAN_LIMIT))
+        found = sorted(dict.fromkeys(self.entry_ids[start:end]), key=self.kinds.__getitem__)
+        return [
+            (self.kinds[i], self.label(i), self.car_ids[i] or None, self.generation_ids[i] or None)
+            for i in found[:limit]
+        ]
+
+
+_index = None
+_version = None
+_rebuilding = False
+_lock = threading.Lock()
+
+
+def get_index():
+    """
+    The current index. The first call builds it; once the catalog version
+    changes, the old index keeps serving while a new one is built in the
+    background.
+    """
+    global _index, _version, _rebuilding
+    version = catalog_version()
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = PrefixIndex.from_catalog()
+                _version = version
+    elif version != _version:
+        with _lock:
+            if not _rebuilding and version != _version:
+                _rebuilding = True
+                threading.Thread(target=rebuild, args=(version,), daemon=True).start()
+    return _index
+
+
+def rebuild(version):
+    global _index, _version, _rebuilding
+    try:
+        index = PrefixIndex.from_catalog()
+        with _lock:
+            _index, _version = index, version
+    finally:
+        _rebuilding = False
+        connections.close_all()
+
+
+def suggest(query, limit=10):
+    """JSON-ready suggestions for a search-box prefix."""
+    results = []
+    for kind, label, car_id, generation_id in get_index().lookup(query, limit):
+        if kind == BRAND:
+            url = f"{reverse('cars:car_list')}?{urlencode({'brand': label})}"
+        else:
+            url = reverse('cars:car_detail', args=[car_id])
+            if generation_id:
+                url += f"?gen={generation_id}"
+        results.append({'label': label, 'kind': KIND_NAMES[kind], 'url': url})
+    return results
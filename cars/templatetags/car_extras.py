@@ -1,5 +1,7 @@
 from django import template
 
+from cars import images
+
 register = template.Library()
 
 
@@ -12,3 +14,11 @@ def get_attribute(obj, attr):
         return getattr(obj, attr, None)
     except (AttributeError, TypeError):
         return None
+
+
+@register.filter
+def image_set(obj, angle='01'):
+    """Local src/srcset/webp_srcset of a Car or Generation image angle, or None."""
+    if obj is None:
+        return None
+    return images.image_set(obj, angle)
@@ -0,0 +1,544 @@
+import base64
+import functools
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from . import images, search, views
+from .caching import bump_catalog_version, catalog_version, normalized_query
+from .management.commands import fetch_autopedia, fetch_wikipedia
+from .management.mediawiki import MediaWikiClient, iter_page_contents
+from .management.wikitext import Document
+from .management.writer import CarWriter
+from .models import GALLERY_ANGLES, Car, Generation
+from .pagination import CursorPaginator, InvalidCursor, decode_cursor
+from .signals import import_finished
+from .suggestions import MODEL, PrefixIndex
+
+
+def make_token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+class StubServer:
+    """
+    Serves app(path, query) -> (status, content type, body) on a local port
+    for as long as the test runs.
+    """
+
+    def __init__(self, test, app):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, content_type, body = app(url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        test.addCleanup(server.server_close)
+        test.addCleanup(server.shutdown)
+        self.url = f'http://127.0.0.1:{server.server_port}/'
+
+
+class StubWiki:
+    """
+    A MediaWiki api.php listing pages two at a time and serving their
+    wikitext. Batched revision queries report pages in missing as missing
+    and leave out the content of pages in truncated, as the real API does
+    when a response grows too large; action=parse serves every page.
+    """
+
+    WIKITEXT = (
+        "{{Models\n| production = 2001–2006\n| body_style = Sedan\n}}\n"
+        "The {title} is a car built in Germany for many years by a famous manufacturer.\n\n"
+        "== First Generation (2001–2006) ==\nengine: 2.0 L I4\n300 hp (224 kW)\n"
+    )
+
+    # list= module -> its continuation parameter
+    LISTS = {'allpages': 'apcontinue', 'categorymembers': 'cmcontinue'}
+
+    def __init__(self, titles):
+        self.pages = {page_id: title for page_id, title in enumerate(titles, 1)}
+        self.fail_listing_from = None
+        self.missing = set()
+        self.truncated = set()
+        self.requests = []
+
+    def __call__(self, path, query):
+        self.requests.append(query)
+        if query.get('list') in self.LISTS:
+            listing = query['list']
+            start = int(query.get(self.LISTS[listing], 1))
+            if start == self.fail_listing_from:
+                return 404, 'text/plain', b'Not found'
+            page_ids = [page_id for page_id in sorted(self.pages) if page_id >= start][:2]
+            data = {'query': {listing: [{'pageid': i, 'ns': 0, 'title': self.pages[i]} for i in page_ids]}}
+            if page_ids and page_ids[-1] < max(self.pages):
+                data['continue'] = {self.LISTS[listing]: str(page_ids[-1] + 1)}
+        elif query.get('prop') == 'revisions':
+            page_ids = [int(page_id) for page_id in query['pageids'].split('|')]
+            data = {'query': {'pages': [self.revision(page_id) for page_id in page_ids]}}
+        elif query.get('action') == 'parse':
+            page_id = next(page_id for page_id, title in self.pages.items() if title == query['page'])
+            data = {'parse': {
+                'title': query['page'], 'pageid': page_id, 'revid': 1000 + page_id,
+                'wikitext': {'*': self.WIKITEXT.format(title=query['page'])},
+            }}
+        else:
+            data = {}
+        return 200, 'application/json', json.dumps(data).encode()
+
+    def revision(self, page_id):
+        title = self.pages[page_id]
+        if page_id in self.missing:
+            return {'pageid': page_id, 'title': title, 'missing': True}
+        if page_id in self.truncated:
+            return {'pageid': page_id, 'title': title}
+        return {
+            'pageid': page_id, 'title': title,
+            'revisions': [{'revid': 1000 + page_id, 'slots': {'main': {'content': self.WIKITEXT.format(title=title)}}}],
+        }
+
+    def fetched_page_ids(self):
+        return [
+            int(page_id)
+            for query in self.requests if query.get('prop') == 'revisions'
+            for page_id in query['pageids'].split('|')
+        ]
+
+
+class StubWikipedia(StubWiki):
+    WIKITEXT = (
+        "{{{{Infobox automobile\n| manufacturer = [[Audi]]\n| production = 2001–2006\n"
+        "| engine = 2.0 L I4 (300 hp)\n| body_style = [[Sedan (automobile)|Sedan]]\n}}}}\n"
+        "The {title} is a compact executive car built in Germany for many years by Audi.\n"
+    )
+
+
+class PageContentTests(SimpleTestCase):
+    def test_batches_fall_back_to_single_pages(self):
+        wiki = StubWiki([f'Car {i}' for i in range(1, 6)])
+        wiki.missing = {2}
+        wiki.truncated = {4}
+        client = MediaWikiClient(StubServer(self, wiki).url)
+        pages = [{'pageid': page_id, 'title': title} for page_id, title in wiki.pages.items()]
+
+        results = list(iter_page_contents(pages, client, batch_size=3))
+
+        self.assertEqual([page for page, _ in results], pages)
+        for page, revision in results:
+            self.assertEqual(revision.revid, 1000 + page['pageid'])
+            self.assertEqual(revision.content, StubWiki.WIKITEXT.format(title=page['title']))
+        # Two batched requests, then one per page they did not return
+        self.assertEqual(wiki.fetched_page_ids(), [1, 2, 3, 4, 5])
+        self.assertEqual(len(wiki.requests), 4)
+        self.assertEqual([query['page'] for query in wiki.requests if query.get('action') == 'parse'], ['Car 2', 'Car 4'])
+
+
+class TemplateTests(SimpleTestCase):
+    def test_outermost_templates(self):
+        source = 'Intro }} {{Models|a={{convert|1|{{x}}}}}} text {{ {{Stub}} end'
+        document = Document(source[6:], offset=6, source=source)
+        self.assertEqual(
+            [source[t.start:t.end] for t in document.templates],
+            ['{{Models|a={{convert|1|{{x}}}}}}', '{{Stub}}'],
+        )
+        self.assertEqual(document.find_template('models').params['a'], '{{convert|1|{{x}}}}')
+
+    def test_parameters_are_text(self):
+        source = 'A {{{1}}} {{Models|a={{{2|{{x}}}}}|b=2}} {{{{{y}}}}} {{{3|{{{4}}}}}}'
+        document = Document(source)
+        self.assertEqual(
+            [source[t.start:t.end] for t in document.templates],
+            ['{{Models|a={{{2|{{x}}}}}|b=2}}', '{{{{{y}}}}}'],
+        )
+        self.assertEqual(document.templates[0].params, {'a': '{{{2|{{x}}}}}', 'b': '2'})
+        self.assertEqual(document.strip_templates(), 'A {{{1}}}   {{{3|{{{4}}}}}}')
+
+
+class CatalogTestCase(TestCase):
+    """Starts each test with an empty cache and its own catalog version file."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOG_VERSION_FILE=Path(directory.name) / 'catalog_version')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class CursorTests(CatalogTestCase):
+    BAD_TOKENS = [
+        'not-a-cursor',
+        make_token(['sideways', ['a', 'b', 1]]),
+        make_token(['next', ['a', 'b']]),
+        make_token(['next', [{}, 1, 2]]),
+        make_token(['next', [[1], 'a', 1]]),
+        make_token(['next', [True, 'a', 1]]),
+        make_token(['next', [None, 'a', 1]]),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        Car.objects.bulk_create([Car(brand='Audi', name=f'A{i}') for i in range(5)])
+
+    def test_bad_tokens_are_invalid(self):
+        for token in self.BAD_TOKENS:
+            with self.subTest(token=token), self.assertRaises(InvalidCursor):
+                decode_cursor(token, 3)
+
+    def test_round_trip(self):
+        paginator = CursorPaginator(Car.objects.all(), 2)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual([car.name for car in second], ['A2', 'A3'])
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    def test_bad_tokens_in_views(self):
+        for token in self.BAD_TOKENS:
+            with self.subTest(token=token):
+                self.assertEqual(self.client.get(reverse('cars:car_list'), {'cursor': token}).status_code, 200)
+                self.assertEqual(self.client.get(reverse('cars:api_car_list'), {'cursor': token}).status_code, 400)
+
+
+class NormalizedQueryTests(TestCase):
+    def normalize(self, query_string):
+        return normalized_query(RequestFactory().get('/?' + query_string))
+
+    def test_equivalent_queries_match(self):
+        self.assertEqual(self.normalize('query=&brand=BMW&sort=+power'), self.normalize('sort=power&brand=BMW'))
+
+    def test_separators_in_values_are_escaped(self):
+        self.assertNotEqual(self.normalize('query=x%26sort%3Dprice'), self.normalize('query=x&sort=price'))
+
+
+class CacheVersionTests(CatalogTestCase):
+    def test_deploy_version_changes_etags(self):
+        bump_catalog_version()
+        car = Car.objects.create(brand='Audi', name='A4')
+        for url in (reverse('cars:car_list'), reverse('cars:car_detail', args=[car.pk])):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                with self.settings(CATALOG_CACHE_VERSION='deployed'):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response['ETag'], etag)
+
+
+class ResumeTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wiki = StubWiki([f'Audi Model{i}' for i in range(1, 7)])
+        patcher = mock.patch.object(fetch_autopedia.Command, 'BASE_URL', StubServer(self, self.wiki).url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = Path(directory.name) / 'autopedia.json'
+
+    def fetch(self, *args):
+        call_command('fetch_autopedia', '--rate', '0', '--checkpoint', str(self.checkpoint), *args, stdout=mock.Mock(), stderr=mock.Mock())
+
+    def test_failed_listing_keeps_checkpoint_for_resume(self):
+        finished = mock.Mock()
+        import_finished.connect(finished)
+        self.addCleanup(import_finished.disconnect, finished)
+
+        self.wiki.fail_listing_from = 5
+        with self.assertRaises(CommandError):
+            self.fetch()
+        self.assertTrue(self.checkpoint.exists())
+        self.assertEqual(Car.objects.count(), 4)
+        finished.assert_not_called()
+
+        self.wiki.fail_listing_from = None
+        self.wiki.requests.clear()
+        self.fetch('--resume')
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(Car.objects.count(), 6)
+        self.assertEqual(self.wiki.fetched_page_ids(), [5, 6])
+        finished.assert_called_once()
+
+    def test_partial_import_invalidates_cached_pages(self):
+        bump_catalog_version()
+        url = reverse('cars:car_list')
+        etag = self.client.get(url)['ETag']
+
+        self.wiki.fail_listing_from = 3
+        with self.assertRaises(CommandError):
+            self.fetch()
+        self.assertEqual(Car.objects.count(), 2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+
+class BackfillTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # Written without signals, as by a migration or an older import
+        self.car = Car.objects.create(brand='Audi', name='A4')
+        Generation.objects.bulk_create([Generation(car=self.car, name='B6', year_start=2001, horsepower='300 hp')])
+        bump_catalog_version()
+        self.version = catalog_version()
+
+    def test_recompute_year_ranges_bumps_version(self):
+        call_command('recompute_year_ranges', stdout=mock.Mock())
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.min_year, 2001)
+        self.assertNotEqual(catalog_version(), self.version)
+
+    def test_backfill_specs_bumps_version(self):
+        call_command('backfill_specs', stdout=mock.Mock())
+        self.assertEqual(Generation.objects.get().horsepower_hp, 300)
+        self.assertNotEqual(catalog_version(), self.version)
+
+
+class WikipediaImportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wiki = StubWikipedia(['Audi A4', 'Audi A6', 'Category:Audi', 'Audi A8'])
+        patcher = mock.patch.object(fetch_wikipedia.Command, 'BASE_URL', StubServer(self, self.wiki).url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = Path(directory.name) / 'wikipedia.json'
+
+    def fetch(self, *args):
+        call_command(
+            'fetch_wikipedia', '--category', 'Audi vehicles', '--checkpoint', str(self.checkpoint), *args,
+            stdout=mock.Mock(), stderr=mock.Mock(),
+        )
+
+    def test_import_and_update(self):
+        # Page IDs of another wiki do not collide
+        autopedia = Car.objects.create(brand='Audi', name='Quattro', data_source='autopedia', wiki_page_id=1)
+
+        self.fetch()
+        cars = Car.objects.filter(data_source='wikipedia').order_by('wiki_page_id')
+        self.assertEqual([(car.wiki_page_id, car.name) for car in cars], [(1, 'A4'), (2, 'A6'), (4, 'A8')])
+        car = cars[0]
+        self.assertEqual((car.brand, car.body_style, car.min_year, car.wiki_revision_id), ('Audi', 'Sedan', 2001, 1001))
+        generation = car.generations.get()
+        self.assertEqual((generation.engine, generation.horsepower_hp), ('2.0 L I4 (300 hp)', 300))
+        self.assertFalse(self.checkpoint.exists())
+
+        self.fetch()
+        self.assertEqual(Car.objects.filter(data_source='wikipedia').count(), 3)
+        self.assertEqual(Generation.objects.filter(car__data_source='wikipedia').count(), 3)
+        autopedia.refresh_from_db()
+        self.assertEqual(autopedia.name, 'Quattro')
+
+    def test_interrupted_import_resumes_after_committed_pages(self):
+        parse_car_data = fetch_wikipedia.Command.parse_car_data
+
+        def interrupt(command, title, content):
+            if title == 'Audi A8':
+                raise KeyboardInterrupt
+            return parse_car_data(command, title, content)
+
+        writer = functools.partial(CarWriter, batch_size=1)
+        with mock.patch.object(fetch_wikipedia, 'CarWriter', writer), \
+                mock.patch.object(fetch_wikipedia.Command, 'parse_car_data', interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.fetch()
+        self.assertTrue(self.checkpoint.exists())
+        self.assertEqual(Car.objects.count(), 2)
+
+        self.wiki.requests.clear()
+        self.fetch('--resume')
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(Car.objects.count(), 3)
+        self.assertEqual(self.wiki.fetched_page_ids(), [4])
+
+
+class SuggestionIndexTests(TestCase):
+    def test_cars_written_during_build_are_skipped(self):
+        Generation.objects.create(car=Car.objects.create(brand='Audi', name='A4'), code='B6')
+        exclude = Generation.objects.exclude
+
+        def write_car_then_exclude(*args, **kwargs):
+            # Committed between the car and generation scans
+            Generation.objects.create(car=Car.objects.create(brand='Audi', name='A6'), code='C5')
+            return exclude(*args, **kwargs)
+
+        with mock.patch.object(Generation.objects, 'exclude', side_effect=write_car_then_exclude):
+            index = PrefixIndex.from_catalog()
+        self.assertEqual(sorted(index.texts[i] for i in range(len(index.texts)) if index.kinds[i] == MODEL), ['A4'])
+        self.assertEqual(len(index.generation_ids), 3)
+
+
+class CatalogQueryTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cars = Car.objects.bulk_create([Car(brand='Audi', name=f'A{i}') for i in range(30)])
+        Generation.objects.bulk_create([
+            Generation(car=car, name=name, year_start=year)
+            for car in cars for name, year in (('Mk1', 2001), ('Mk2', 2010))
+        ])
+
+    def render_catalog(self, per_page, queries, **params):
+        cache.clear()
+        with mock.patch.object(views, 'CARS_PER_PAGE', per_page), self.assertNumQueries(queries):
+            response = self.client.get(reverse('cars:car_list'), params)
+        self.assertEqual(len(response.context['page_obj']), per_page)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # Facets, the page itself and its cached count
+        for per_page in (4, 24):
+            with self.subTest(per_page=per_page):
+                self.render_catalog(per_page, 3)
+
+    def test_sorted_query_count_does_not_grow_with_page_size(self):
+        # Facets, the count and the page
+        for per_page in (4, 24):
+            with self.subTest(per_page=per_page):
+                self.render_catalog(per_page, 3, sort='power')
+
+
+class StubCdn:
+    """An image CDN serving the same transparent PNG for every car."""
+
+    def __init__(self):
+        self.fail = False
+        self.requests = []
+        buffer = BytesIO()
+        Image.new('RGBA', (800, 400), (200, 30, 30, 128)).save(buffer, 'PNG')
+        self.image = buffer.getvalue()
+
+    def __call__(self, path, query):
+        self.requests.append(query)
+        if self.fail:
+            return 503, 'text/plain', b'Unavailable'
+        return 200, 'image/png', self.image
+
+
+class CarImageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cdn = StubCdn()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, IMAGE_CDN_URL=StubServer(self, self.cdn).url + 'getimage')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.car = Car.objects.create(brand='Audi', name='A4')
+        Generation.objects.create(car=self.car, name='B6', year_start=2001)
+        self.key = images.image_key(self.car.image_base_url)
+
+    def get_image(self, width, fmt, angle='01'):
+        return self.client.get(reverse('cars:car_image', kwargs={
+            'kind': 'car', 'pk': self.car.pk, 'key': self.key, 'angle': angle, 'width': width, 'fmt': fmt,
+        }))
+
+    def test_first_request_stores_every_variant(self):
+        response = self.get_image(320, 'webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).width, 320)
+        response.close()
+        self.assertTrue(images.has_variants(self.key, '01'))
+        self.assertEqual(self.cdn.requests[0]['width'], '800')
+
+        # Every other width and format of the angle is served from disk
+        for width in images.IMAGE_WIDTHS:
+            response = self.get_image(width, 'jpg')
+            self.assertEqual(response['Content-Type'], 'image/jpeg')
+            response.close()
+        self.assertEqual(len(self.cdn.requests), 1)
+
+    def test_cdn_failure_redirects_to_cdn(self):
+        self.cdn.fail = True
+        response = self.get_image(640, 'jpg')
+        self.assertRedirects(response, self.car.get_image_url('01', 640), fetch_redirect_response=False)
+        self.assertFalse(images.variant_path(self.key, '01', 640, 'jpg').exists())
+
+    def test_prefetch_fetches_each_image_once(self):
+        # The car and its only generation share one image
+        call_command('prefetch_images', '--rate', '0', stdout=mock.Mock())
+        self.assertEqual(sorted(query['angle'] for query in self.cdn.requests), sorted(GALLERY_ANGLES))
+        for angle in GALLERY_ANGLES:
+            self.assertTrue(images.has_variants(self.key, angle))
+
+        call_command('prefetch_images', '--rate', '0', stdout=mock.Mock())
+        self.assertEqual(len(self.cdn.requests), len(GALLERY_ANGLES))
+
+
+class DeleteSignalTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.car = Car.objects.create(brand='Audi', name='A4')
+        Generation.objects.bulk_create([
+            Generation(car=self.car, name=name, year_start=year)
+            for name, year in (('B5', 1994), ('B6', 2001), ('B7', 2004))
+        ])
+
+    def test_deleting_car_reindexes_once(self):
+        # Select and delete the generations, delete the car, reindex it
+        with mock.patch('cars.signals.bump_catalog_version') as bump, self.assertNumQueries(5):
+            self.car.delete()
+        bump.assert_called_once()
+
+    def test_deleting_cars_reindexes_each_once(self):
+        # As above, after selecting the cars
+        with mock.patch('cars.signals.bump_catalog_version') as bump, self.assertNumQueries(6):
+            Car.objects.filter(pk=self.car.pk).delete()
+        bump.assert_called_once()
+
+    def test_deleting_generation_updates_car(self):
+        Generation.objects.get(name='B5').delete()
+        self.car.refresh_from_db()
+        self.assertEqual((self.car.min_year, self.car.max_year), (2001, 2004))
+
+
+class SearchOrderTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # More description matches than are ranked, and the best match last
+        Car.objects.bulk_create([
+            Car(brand='Audi' if i % 2 else 'BMW', name=f'Model {i}', description='Keeps its focus on the road.')
+            for i in range(2 * search.RANKED_MATCHES + 100)
+        ] + [Car(brand='Ford', name='Focus', description='A family car.')])
+        search.rebuild()
+
+    def test_name_matches_rank_first(self):
+        cars = search.search(Car.objects.all(), 'focus')
+        self.assertEqual(cars.count(), search.RANKED_MATCHES)
+        self.assertEqual(cars[0].name, 'Focus')
+
+    def test_filters_apply_before_ranking(self):
+        cars = search.search(Car.objects.filter(brand='Audi'), 'focus')
+        self.assertEqual(cars.count(), search.RANKED_MATCHES)
+        self.assertEqual(set(cars.values_list('brand', flat=True)), {'Audi'})
+        self.assertFalse(search.search(Car.objects.filter(brand='Ford'), 'road').exists())
+
+    def test_catalog_lists_best_matches(self):
+        response = self.client.get(reverse('cars:car_list'), {'query': 'focus', 'brand': 'Ford'})
+        self.assertEqual([car.name for car in response.context['page_obj']], ['Focus'])
+        response = self.client.get(reverse('cars:car_list'), {'query': 'focus'})
+        self.assertEqual(response.context['page_obj'][0].name, 'Focus')
+
+    def test_api_lists_every_match(self):
+        response = self.client.get(reverse('cars:api_car_list'), {'query': 'focus'})
+        self.assertEqual(response.json()['count'], 2 * search.RANKED_MATCHES + 101)
@@ -7,4 +7,12 @@ urlpatterns = [
     path('', views.car_list, name='car_list'),
     path('car/<int:pk>/', views.car_detail, name='car_detail'),
     path('compare/', views.car_compare, name='car_compare'),
+    path('api/suggest', views.suggest, name='suggest'),
+    path('api/cars/', views.api_car_list, name='api_car_list'),
+    path('api/cars/<int:pk>/', views.api_car_detail, name='api_car_detail'),
+    path('api/cars/export.ndjson', views.api_car_export, name='api_car_export'),
+    path(
+        'images/<str:kind>/<int:pk>/<slug:key>/<slug:angle>-<int:width>.<slug:fmt>',
+        views.car_image, name='car_image'
+    ),
 ]
@@ -1,74 +1,285 @@
-from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
+from django.shortcuts import redirect, render, get_object_or_404
+from django.db.models import Exists, F, OuterRef, Q, Subquery
 from django.core.paginator import Paginator
-from .models import Car, Generation
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from . import api, fuzzy, images, search, suggestions
+from .caching import (
+    FRAGMENT_TIMEOUT, cache_catalog_page, cache_version, catalog_etag, catalog_last_modified, catalog_version,
+)
+from .models import GALLERY_ANGLES, Car, Generation
 from .forms import CarSearchForm, CarFilterForm
+from .pagination import CursorPaginator, InvalidCursor
 
+# Filter form field -> Generation lookup
+SPEC_RANGE_FILTERS = {
+    'hp_min': 'horsepower_hp__gte',
+    'hp_max': 'horsepower_hp__lte',
+    'top_speed_min': 'top_speed_kmh__gte',
+    'top_speed_max': 'top_speed_kmh__lte',
+    'acceleration_min': 'acceleration_s__gte',
+    'acceleration_max': 'acceleration_s__lte',
+}
 
+# sort= key -> (Generation field, whether higher is better)
+SORT_SPECS = {
+    'power': ('horsepower_hp', True),
+    'speed': ('top_speed_kmh', True),
+    'acceleration': ('acceleration_s', False),
+}
+
+CARS_PER_PAGE = 12
+API_CARS_PER_PAGE = 50
+
+# Seconds a catalog result count is reused across cursor pages
+CATALOG_COUNT_TIMEOUT = 300
+
+# Image URLs change whenever the image does
+IMAGE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+@cache_catalog_page
 def car_list(request):
     cars = Car.objects.all()
     search_form = CarSearchForm(request.GET)
     filter_form = CarFilterForm(request.GET)
+    # Invalid fields are left out of cleaned_data, so they are simply ignored
+    filter_form.is_valid()
+    filters = filter_form.cleaned_data
+
+    cars, generations = filter_cars(cars, filters)
 
     query = request.GET.get('query', '').strip()
+    corrected_query = None
+    ranked = False
     if query:
-        cars = cars.filter(
-            Q(name__icontains=query) | Q(brand__icontains=query)
+        matches, ranked = search_cars(cars, query)
+        # Fall back to the closest catalog words when nothing matches as typed
+        if not matches.exists():
+            corrected_query = fuzzy.correct(query)
+            if corrected_query:
+                matches, ranked = search_cars(cars, corrected_query)
+        cars = matches
+
+    sort = filters.get('sort')
+    if sort in SORT_SPECS:
+        field, descending = SORT_SPECS[sort]
+        # Rank each car by its best matching generation
+        best = (
+            generations.filter(**{f'{field}__isnull': False})
+            .order_by(F(field).desc() if descending else F(field).asc())
+            .values(field)[:1]
         )
+        cars = cars.annotate(sort_value=Subquery(best))
+        sort_value = F('sort_value').desc(nulls_last=True) if descending else F('sort_value').asc(nulls_last=True)
+        cars = cars.order_by(sort_value, 'brand', 'name')
 
-    brand = request.GET.get('brand')
-    if brand:
-        cars = cars.filter(brand=brand)
+    # Card images need each car's first generation year; fetch it with the page
+    first_generation = Generation.objects.filter(car=OuterRef('pk')).order_by('-year_start')
+    cars = cars.annotate(first_generation_year=Subquery(first_generation.values('year_start')[:1]))
 
-    year_min = request.GET.get('year_min')
-    year_max = request.GET.get('year_max')
-    if year_min or year_max:
-        # Filter by generation years
-        gen_filter = Q()
-        if year_min:
-            gen_filter &= Q(generations__year_start__gte=year_min) | Q(generations__year_end__gte=year_min)
-        if year_max:
-            gen_filter &= Q(generations__year_start__lte=year_max)
-        cars = cars.filter(gen_filter).distinct()
-
-    paginator = Paginator(cars, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # The default (brand, name) order pages by cursor, so deep pages cost the
+    # same as the first; sorted and ranked results keep numbered pages
+    cursor_mode = sort not in SORT_SPECS and not ranked
+    if cursor_mode:
+        paginator = CursorPaginator(cars, CARS_PER_PAGE, count_timeout=CATALOG_COUNT_TIMEOUT)
+        try:
+            page_obj = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            page_obj = paginator.page()
+    else:
+        paginator = Paginator(cars, CARS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Keep search, filters and sort when following pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
 
     context = {
         'page_obj': page_obj,
+        'cursor_mode': cursor_mode,
         'search_form': search_form,
         'filter_form': filter_form,
+        'querystring': params.urlencode(),
+        'corrected_query': corrected_query,
+        'cache_version': cache_version(),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     }
     return render(request, 'cars/car_list.html', context)
 
 
+def filter_cars(cars, filters):
+    """
+    Apply CarFilterForm's cleaned_data to a Car queryset. Returns (cars,
+    generations), the latter a subquery of each car's matching generations.
+    """
+    brand = filters.get('brand')
+    if brand:
+        cars = cars.filter(brand=brand)
+
+    body_style = filters.get('body_style')
+    if body_style:
+        cars = cars.filter(body_style=body_style)
+
+    # Years filter on the car's own indexed year range; the generation
+    # conditions below still pick the generations that sorting ranks
+    gen_filter = Q()
+    year_min = filters.get('year_min')
+    year_max = filters.get('year_max')
+    decade = filters.get('decade')
+    if decade is not None:
+        # A decade narrows any typed year range to the years both cover
+        year_min = decade if year_min is None else max(year_min, decade)
+        year_max = decade + 9 if year_max is None else min(year_max, decade + 9)
+    if year_min is not None:
+        cars = cars.filter(max_year__gte=year_min)
+        gen_filter &= Q(year_start__gte=year_min) | Q(year_end__gte=year_min)
+    if year_max is not None:
+        cars = cars.filter(min_year__lte=year_max)
+        gen_filter &= Q(year_start__lte=year_max)
+
+    # With spec filters, a car matches when one of its generations satisfies
+    # every generation filter
+    spec_filter = Q()
+    for field, lookup in SPEC_RANGE_FILTERS.items():
+        if filters.get(field) is not None:
+            spec_filter &= Q(**{lookup: filters[field]})
+    gen_filter &= spec_filter
+
+    # Correlated subqueries use the (car, spec) indexes instead of joining
+    # every generation and de-duplicating
+    generations = Generation.objects.filter(gen_filter, car=OuterRef('pk'))
+    if spec_filter:
+        cars = cars.filter(Exists(generations))
+    return cars, generations
+
+
+def search_cars(cars, query, best=True):
+    """
+    Filter cars by a search query. Returns (cars, ranked), where ranked
+    means they are full-text matches: with best, only the best of them,
+    ordered by relevance (see cars.search), otherwise all of them.
+    """
+    if not search.available():
+        matches = None
+    else:
+        matches = search.search(cars, query) if best else search.matching(cars, query)
+    if matches is not None:
+        return matches, True
+    return cars.filter(Q(name__icontains=query) | Q(brand__icontains=query)), False
+
+
+def car_etag(request, pk):
+    return f"{cache_version()}-{pk}" if catalog_version() else None
+
+
+def car_last_modified(request, pk):
+    return Car.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+
+
+# Validators are checked before the page cache, so a 304 renders nothing
+@condition(etag_func=car_etag, last_modified_func=car_last_modified)
+@cache_catalog_page
 def car_detail(request, pk):
     car = get_object_or_404(Car, pk=pk)
-    generations = car.generations.all()
+    # One query; each generation's .car is the instance above, so gallery
+    # URLs need no further lookups
+    generations = list(car.generations.all())
+    car.first_generation_year = generations[0].year_start if generations else None
 
     # Get selected generation (default to first/newest)
     gen_id = request.GET.get('gen')
     if gen_id:
-        selected_gen = generations.filter(pk=gen_id).first()
+        selected_gen = next((gen for gen in generations if str(gen.pk) == gen_id), None)
     else:
-        selected_gen = generations.first()
+        selected_gen = generations[0] if generations else None
 
     # Get gallery images for selected generation or car
-    if selected_gen:
-        gallery_images = selected_gen.get_gallery_images()
-    else:
-        gallery_images = car.get_gallery_images()
+    gallery_images = images.gallery(selected_gen or car)
 
     context = {
         'car': car,
         'generations': generations,
         'selected_gen': selected_gen,
         'gallery_images': gallery_images,
+        'cache_version': cache_version(),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     }
     return render(request, 'cars/car_detail.html', context)
 
 
+@require_safe
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+@cache_catalog_page
+def api_car_list(request):
+    """
+    Cars with their generations as JSON, filtered like the catalog (plus
+    ?query=) and paged by cursor in brand/name order.
+    """
+    filter_form = CarFilterForm(request.GET)
+    filter_form.is_valid()
+    cars, _ = filter_cars(Car.objects.all(), filter_form.cleaned_data)
+    query = request.GET.get('query', '').strip()
+    if query:
+        cars, _ = search_cars(cars, query, best=False)
+
+    paginator = CursorPaginator(
+        api.car_values(cars), API_CARS_PER_PAGE,
+        key_fields=('brand', 'name', 'id'), count_timeout=CATALOG_COUNT_TIMEOUT,
+    )
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({
+        'count': page.count,
+        'next': api_page_url(request, page.next_cursor),
+        'previous': api_page_url(request, page.previous_cursor),
+        'results': api.attach_generations(page.object_list),
+    })
+
+
+def api_page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+@require_safe
+@condition(etag_func=car_etag, last_modified_func=car_last_modified)
+def api_car_detail(request, pk):
+    cars = list(api.car_values(Car.objects.filter(pk=pk)))
+    if not cars:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse(api.attach_generations(cars)[0])
+
+
+@require_safe
+def api_car_export(request):
+    """
+    Every car matching the catalog filters, with its generations, as
+    newline-delimited JSON streamed in id order.
+    """
+    filter_form = CarFilterForm(request.GET)
+    filter_form.is_valid()
+    cars, _ = filter_cars(Car.objects.order_by('id'), filter_form.cleaned_data)
+    return StreamingHttpResponse(api.export_lines(cars), content_type='application/x-ndjson')
+
+
+@require_safe
+def suggest(request):
+    """Search-box suggestions for the prefix in ?q=, served from memory."""
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': suggestions.suggest(query)})
+
+
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+@cache_catalog_page
 def car_compare(request):
     """Compare up to 4 cars side by side."""
     car_ids_str = request.GET.get('cars', '')
@@ -103,3 +314,35 @@ def car_compare(request):
         'specs': specs,
     }
     return render(request, 'cars/car_compare.html', context)
+
+
+@require_safe
+def car_image(request, kind, pk, key, angle, width, fmt):
+    """
+    Serve a resized car image from the local cache, downloading it from the
+    CDN on first request. The URL changes with the image, so responses are
+    cacheable forever.
+    """
+    if kind not in ('car', 'generation') or angle not in GALLERY_ANGLES or width not in images.IMAGE_WIDTHS or fmt not in images.IMAGE_FORMATS:
+        raise Http404("Unknown image variant")
+
+    path = images.variant_path(key, angle, width, fmt)
+    if not path.exists():
+        if kind == 'car':
+            obj = get_object_or_404(Car, pk=pk)
+        else:
+            obj = get_object_or_404(Generation.objects.select_related('car'), pk=pk)
+        if not obj.image_base_url:
+            raise Http404("No image for this car")
+        if images.image_key(obj.image_base_url) != key:
+            # The car changed since the page was rendered
+            return redirect(images.image_url(obj, angle, width, fmt))
+        try:
+            images.fetch_variants(obj.image_base_url, angle)
+        except images.ImageFetchError:
+            # Let the browser try the CDN directly; not cached, so the next request retries
+            return redirect(obj.get_image_url(angle, width))
+
+    response = FileResponse(open(path, 'rb'), content_type=images.IMAGE_FORMATS[fmt][1])
+    patch_cache_control(response, public=True, max_age=IMAGE_MAX_AGE, immutable=True)
+    return response